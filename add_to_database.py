@@ -1,61 +1,84 @@
-import requests
-from pymongo import MongoClient, UpdateOne
+import time
+from pymongo import UpdateOne, UpdateMany, ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from get_iit_guys import fetch_user_infos
+from mongo import get_database
 from extract_div import extract_division
+from cf_tags import tag_key
 from collections import defaultdict
 
-POPULAR_TAGS = [
-    'implementation', 'greedy', 'dp', 'math', 'brute force',
-    'data structures', 'binary search', 'constructive algorithms',
-    'dfs and similar', 'sorting'
-]
+# Number of operations sent per bulk_write round-trip
+BULK_WRITE_CHUNK_SIZE = 1000
 
-def update_users_from_api(valid_participants):
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client['coding_platform']
+def bulk_upsert(collection, operations, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Flush a list of write operations to `collection` with unordered bulk_write,
+    `chunk_size` operations at a time. One failing operation doesn't stop the rest.
+    Returns a summary dict with matched, upserted and failed counts.
+    """
+    summary = {'matched': 0, 'upserted': 0, 'failed': 0}
+
+    for i in range(0, len(operations), chunk_size):
+        chunk = operations[i:i+chunk_size]
+        try:
+            result = collection.bulk_write(chunk, ordered=False)
+            summary['matched'] += result.matched_count
+            summary['upserted'] += result.upserted_count
+        except BulkWriteError as e:
+            # Unordered writes still apply everything that didn't error
+            details = e.details
+            summary['matched'] += details.get('nMatched', 0)
+            summary['upserted'] += details.get('nUpserted', 0)
+            summary['failed'] += len(details.get('writeErrors', []))
+        except PyMongoError as e:
+            print(f"Bulk write to '{collection.name}' failed: {e}")
+            summary['failed'] += len(chunk)
+
+    print(f"'{collection.name}': {summary['matched']} matched, "
+          f"{summary['upserted']} upserted, {summary['failed']} failed")
+    return summary
+
+def update_users_from_api(valid_participants, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    db = get_database()
     users_col = db['users']
 
+    # A handful of batched user.info calls instead of one per handle
+    handles = [entry.get('handle') for entry in valid_participants]
+    user_infos = {h.lower(): user for h, user in fetch_user_infos(handles).items()}
+    operations = []
+
     for entry in valid_participants:
         handle = entry.get('handle')
         mapped_org = entry.get('mapped_organization')
-        
-        try:
-            # API request
-            response = requests.get(f"https://codeforces.com/api/user.info?handles={handle}")
-            response.raise_for_status()
-            data = response.json()
+        user_data = user_infos.get(handle.lower())
+        if user_data is None:
+            print(f"Skipping {handle}: Not returned by user.info")
+            continue
 
-            if data['status'] != 'OK' or not data.get('result'):
-                print(f"Skipping {handle}: Invalid API response")
-                continue
+        # Construct user document
+        user_doc = {
+            'handle': user_data.get('handle'),
+            'organization': mapped_org,  # Use mapped_organization instead of API's 'organization'
+            'rating': user_data.get('rating'),
+            'college': mapped_org,       # Assuming college is also mapped
+            'lastOnlineTimeSeconds': user_data.get('lastOnlineTimeSeconds'),
+            'maxRating': user_data.get('maxRating'),
+        }
 
-            user_data = data['result'][0]
+        # Insert or update user
+        operations.append(UpdateOne(
+            {'handle': handle},
+            {'$set': user_doc},
+            upsert=True
+        ))
 
-            # Construct user document
-            user_doc = {
-                'handle': user_data.get('handle'),
-                'organization': mapped_org,  # Use mapped_organization instead of API's 'organization'
-                'rating': user_data.get('rating'),
-                'college': mapped_org,       # Assuming college is also mapped
-                'lastOnlineTimeSeconds': user_data.get('lastOnlineTimeSeconds'),
-                'maxRating': user_data.get('maxRating'),
-            }
-
-            # Insert or update user
-            users_col.update_one(
-                {'handle': handle},
-                {'$set': user_doc},
-                upsert=True
-            )
-            print(f"Updated: {handle}")
-        
-        except Exception as e:
-            print(f"Error processing {handle}: {e}")
+    return bulk_upsert(users_col, operations, chunk_size)
 
 
-def update_contests(contests_list):
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client['coding_platform']
+def update_contests(contests_list, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    db = get_database()
     contests_col = db['contests']
+    operations = []
 
     for contest in contests_list:
         try:
@@ -69,179 +92,286 @@ def update_contests(contests_list):
             }
 
             # Upsert into contests table
-            contests_col.update_one(
+            operations.append(UpdateOne(
                 {'contestId': contest['id']},
                 {'$set': contest_doc},
                 upsert=True
-            )
-            print(f"Updated contest: {contest['name']}")
+            ))
 
         except Exception as e:
             print(f"Error updating contest {contest.get('id')}: {e}")
 
+    return bulk_upsert(contests_col, operations, chunk_size)
 
-def update_problems_from_participants(valid_participants):
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client['coding_platform']
-    problems_col = db['problems']
 
-    # === 🔧 Step 1: Drop all existing indexes except _id ===
-    try:
-        indexes = problems_col.index_information()
-        for index_name in indexes:
-            if index_name != '_id_':
-                problems_col.drop_index(index_name)
-        print("✅ Cleared existing indexes on 'problems'")
-    except Exception as e:
-        print(f"⚠️ Failed to drop indexes: {e}")
-
-    # === ✅ Step 2: Create the correct composite unique index ===
-    try:
-        problems_col.create_index(
-            [('problemId', 1), ('organisation', 1)],
-            unique=True
-        )
-        print("✅ Created composite unique index on (problemId, organisation)")
-    except Exception as e:
-        print(f"⚠️ Failed to create index: {e}")
+def load_contest_divisions(contests_list=()):
+    """
+    Build the contestId -> division map once per run, so aggregators never query
+    the contests collection per submission.
+    Stored contests come first; any contest in `contests_list` (a contest.list result)
+    that isn't stored yet is filled in with extract_division.
+    """
+    db = get_database()
+    contests_col = db['contests']
 
-    # === 🚀 Step 3: Process valid participants ===
-    for participant in valid_participants:
-        handle = participant.get('handle')
-        organisation = participant.get('mapped_organization')
+    contest_divisions = {
+        doc['contestId']: doc.get('div')
+        for doc in contests_col.find({}, {'_id': 0, 'contestId': 1, 'div': 1})
+    }
 
-        try:
-            response = requests.get(f"https://codeforces.com/api/user.status?handle={handle}")
-            response.raise_for_status()
-            data = response.json()
+    filled = 0
+    for contest in contests_list:
+        if contest['id'] not in contest_divisions:
+            contest_divisions[contest['id']] = extract_division(contest['name'])
+            filled += 1
 
-            if data['status'] != 'OK':
-                print(f"⏭️ Skipping {handle}: Invalid API response")
-                continue
+    print(f"Loaded divisions for {len(contest_divisions)} contests ({filled} from contest.list)")
+    return contest_divisions
 
-            submissions = data.get('result', [])
-            solved_problems = set()
 
-            for submission in submissions:
-                if submission.get('verdict') != 'OK':
-                    continue
+# Largest $in list sent in one query
+HANDLE_QUERY_CHUNK_SIZE = 10000
 
-                problem = submission.get('problem', {})
-                contest_id = problem.get('contestId')
-                index = problem.get('index')
+def load_known_handles():
+    """
+    Return the lower-cased handles of every user in the users collection.
+    """
+    db = get_database()
+    users_col = db['users']
+    return {doc['handle'].lower() for doc in users_col.find({}, {'_id': 0, 'handle': 1})}
+
+
+def update_rating_table(rating_changes_by_contest, contest_divisions, known_handles=None, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Store contest.ratingChanges results for known college users in the rating collection,
+    one row per (handle, contestId) together with the contest's div.
+    `known_handles` defaults to the handles in the users collection.
+    """
+    db = get_database()
+    rating_col = db['rating']
+    if known_handles is None:
+        known_handles = load_known_handles()
+    operations = []
+
+    for contest_id, changes in rating_changes_by_contest.items():
+        div = contest_divisions.get(contest_id)
+
+        for change in changes:
+            handle = change['handle']
+            if handle.lower() not in known_handles:
+                continue
 
-                if not contest_id or not index:
-                    continue  # Skip malformed entries
+            rating_doc = {
+                'handle': handle,
+                'contestId': contest_id,
+                'contestName': change.get('contestName'),
+                'div': div,
+                'rank': change.get('rank'),
+                'oldRating': change.get('oldRating'),
+                'newRating': change.get('newRating'),
+                'time': change.get('ratingUpdateTimeSeconds'),
+            }
 
-                problem_id = f"{contest_id}{index}"
-                key = (problem_id, organisation)
+            operations.append(UpdateOne(
+                {'handle': handle, 'contestId': contest_id},
+                {'$set': rating_doc},
+                upsert=True
+            ))
+
+    return bulk_upsert(rating_col, operations, chunk_size)
+
+
+def load_handle_orgs(handles, max_age_seconds):
+    """
+    Look up the cached raw organization of each handle, ignoring entries older than
+    `max_age_seconds`. Returns a dict mapping handle -> organization for fresh hits only.
+    """
+    db = get_database()
+    handle_orgs_col = db['handle_orgs']
+    cutoff = int(time.time()) - max_age_seconds
+    handles = list(handles)
+
+    organizations = {}
+    for i in range(0, len(handles), HANDLE_QUERY_CHUNK_SIZE):
+        chunk = handles[i:i+HANDLE_QUERY_CHUNK_SIZE]
+        for doc in handle_orgs_col.find(
+            {'handle': {'$in': chunk}, 'checkedAt': {'$gte': cutoff}},
+            {'_id': 0, 'handle': 1, 'organization': 1}
+        ):
+            organizations[doc['handle']] = doc.get('organization', '')
+    return organizations
+
+
+def update_handle_orgs(organizations, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Cache the raw organization of every handle looked up via user.info, college or not,
+    so discovery can skip user.info for it until the entry goes stale.
+    """
+    db = get_database()
+    handle_orgs_col = db['handle_orgs']
+    checked_at = int(time.time())
+
+    operations = [
+        UpdateOne(
+            {'handle': handle},
+            {'$set': {'handle': handle, 'organization': organization, 'checkedAt': checked_at}},
+            upsert=True
+        )
+        for handle, organization in organizations.items()
+    ]
+    return bulk_upsert(handle_orgs_col, operations, chunk_size)
 
-                if key in solved_problems:
-                    continue  # Already counted for this user
 
-                solved_problems.add(key)
+def load_sync_state(handles):
+    """
+    Load the per-handle sync state (the id of the newest submission already ingested).
+    Returns a dict mapping handle -> sync_state document; handles never synced are absent.
+    """
+    db = get_database()
+    sync_col = db['sync_state']
 
-                problems_col.update_one(
-                    {'problemId': problem_id, 'organisation': organisation},
-                    {
-                        '$inc': {'solves': 1},
-                        '$setOnInsert': {
-                            'tag': problem.get('tags', []),
-                            'organisation': organisation
-                        }
-                    },
-                    upsert=True
-                )
+    return {
+        doc['handle']: doc
+        for doc in sync_col.find({'handle': {'$in': list(handles)}}, {'_id': 0})
+    }
 
-            print(f"✅ Processed: {handle}")
 
-        except Exception as e:
-            print(f"❌ Error processing {handle}: {e}")
+def update_sync_state(last_submission_ids, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Advance each handle's high-water mark (`last_submission_ids` maps handle -> the id from
+    aggregate.safe_high_water_mark, or None if nothing new was fetched). Marks only move forward.
+    Call this only after the handle's solves have been written.
+    """
+    db = get_database()
+    sync_col = db['sync_state']
+    operations = []
 
+    for handle, last_submission_id in last_submission_ids.items():
+        update = {'$set': {'handle': handle, 'updatedAt': int(time.time())}}
+        if last_submission_id is not None:
+            update['$max'] = {'lastSubmissionId': last_submission_id}
 
-import requests
-from pymongo import MongoClient
-from collections import defaultdict
+        operations.append(UpdateOne({'handle': handle}, update, upsert=True))
 
-POPULAR_TAGS = [
-    'implementation', 'greedy', 'dp', 'math', 'brute force',
-    'data structures', 'binary search', 'constructive algorithms',
-    'dfs and similar', 'sorting'
-]
+    return bulk_upsert(sync_col, operations, chunk_size)
 
-def update_tags_table(valid_participants):
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client['coding_platform']
-    contests_col = db['contests']
-    tags_col = db['tags']
 
-    # 🧹 Drop existing indexes
-    tags_col.drop_indexes()
+def update_solved_table(valid_participants, solves_by_handle, contest_divisions, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Record every (handle, problemId) pair once in the solved collection.
+    Rows are keyed by a unique (handle, problemId) index, so re-ingesting a handle is a no-op;
+    only the handle's organisation is refreshed, on all of its rows (not just this run's solves).
+    """
+    db = get_database()
+    solved_col = db['solved']
 
-    # ✅ Create correct unique index
-    tags_col.create_index([('userId', 1), ('div', 1)], unique=True)
+    operations = []
 
     for participant in valid_participants:
-        handle = participant['handle']
-        print(f"Processing {handle}...")
+        handle = participant.get('handle')
+        organisation = participant.get('mapped_organization')
 
-        try:
-            response = requests.get(f"https://codeforces.com/api/user.status?handle={handle}")
-            response.raise_for_status()
-            submissions = response.json().get('result', [])
-        except Exception as e:
-            print(f"Error fetching submissions for {handle}: {e}")
+        if handle not in solves_by_handle:
+            print(f"⏭️ Skipping {handle}: No submissions fetched")
             continue
 
-        seen_problems = set()
-        tag_counts_by_div = defaultdict(lambda: defaultdict(int))
-
-        for submission in submissions:
-            if submission.get('verdict') != 'OK':
-                continue
-
-            problem = submission.get('problem', {})
-            contestId = problem.get('contestId')
-            index = problem.get('index')
-            if not contestId or not index:
-                continue
-
-            problemId = f"{contestId}{index}"
-            if problemId in seen_problems:
-                continue
-            seen_problems.add(problemId)
-
-            # Get div from contests table
-            contest_doc = contests_col.find_one({'contestId': contestId})
-            if not contest_doc:
-                continue
-            div = contest_doc.get('div')
-            if not div:
-                continue
-
-            tags = problem.get('tags', [])
-            for tag in tags:
-                if tag in POPULAR_TAGS:
-                    tag_key = tag.replace(" ", "_")
-                    tag_counts_by_div[div][tag_key] += 1
-
-        # Insert/update each (userId, div) individually
-        for div, tag_counts in tag_counts_by_div.items():
-            update_doc = {
-                'userId': handle,
-                'div': div,
-            }
-            for tag in POPULAR_TAGS:
-                tag_key = tag.replace(" ", "_")
-                update_doc[tag_key] = tag_counts.get(tag_key, 0)
-
-            tags_col.update_one(
-                {'userId': handle, 'div': div},
-                {'$set': update_doc},
+        # Older rows of a user who changed college would otherwise keep the old one
+        operations.append(UpdateMany(
+            {'handle': handle, 'organisation': {'$ne': organisation}},
+            {'$set': {'organisation': organisation}}
+        ))
+
+        for problem_id, problem in solves_by_handle[handle].items():
+            operations.append(UpdateOne(
+                {'handle': handle, 'problemId': problem_id},
+                {
+                    '$set': {'organisation': organisation},
+                    '$setOnInsert': {
+                        'contestId': problem.get('contestId'),
+                        'div': contest_divisions.get(problem.get('contestId')),
+                        'tags': problem.get('tags', []),
+                    }
+                },
                 upsert=True
-            )
+            ))
 
-    print("✅ Tags table updated (iteratively, with correct index).")
+    return bulk_upsert(solved_col, operations, chunk_size)
 
 
+def update_problems_from_participants():
+    """
+    Recompute problems.solves per (problemId, organisation) from the solved collection
+    with a single aggregation, so repeated runs never double-count.
+    Relies on the (problemId, organisation) unique index created by setupdb.migrate.
+    """
+    db = get_database()
+    solved_col = db['solved']
+    problems_col = db['problems']
+
+    # === 🚀 Step 1: Group solved rows and merge the counts into problems ===
+    computed_at = int(time.time())
+    solved_col.aggregate([
+        {'$group': {
+            '_id': {'problemId': '$problemId', 'organisation': '$organisation'},
+            'solves': {'$sum': 1},
+            'tag': {'$first': '$tags'},
+        }},
+        {'$project': {
+            '_id': 0,
+            'problemId': '$_id.problemId',
+            'organisation': '$_id.organisation',
+            'solves': 1,
+            'tag': 1,
+            'computedAt': {'$literal': computed_at},
+        }},
+        {'$merge': {
+            'into': 'problems',
+            'on': ['problemId', 'organisation'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ])
+
+    # === 🧹 Step 2: Drop rows no longer backed by any solve (e.g. a user changed college) ===
+    stale = problems_col.delete_many({'computedAt': {'$ne': computed_at}})
+    print(f"✅ Problems table recomputed ({stale.deleted_count} stale rows removed)")
+
+
+def update_tags_table(valid_participants, chunk_size=BULK_WRITE_CHUNK_SIZE):
+    """
+    Recompute the per-(userId, div) tag counters of the given participants from the
+    solved collection, for every tag. Counts are stored sparsely in a `tagCounts` map
+    (tag_key -> count, zero counts omitted) and documents are replaced, so re-running
+    is idempotent and clears the legacy flat tag fields.
+    """
+    db = get_database()
+    solved_col = db['solved']
+    tags_col = db['tags']
 
+    handles = list({participant['handle'] for participant in valid_participants})
+    tag_counts_by_user_div = defaultdict(lambda: defaultdict(int))
+
+    rows = solved_col.aggregate([
+        {'$match': {'handle': {'$in': handles}, 'div': {'$ne': None}}},
+        {'$unwind': '$tags'},
+        {'$group': {
+            '_id': {'handle': '$handle', 'div': '$div', 'tag': '$tags'},
+            'count': {'$sum': 1},
+        }},
+    ])
+    for row in rows:
+        key = (row['_id']['handle'], row['_id']['div'])
+        tag_counts_by_user_div[key][tag_key(row['_id']['tag'])] = row['count']
+
+    # Queue one upsert per (userId, div)
+    operations = []
+    for (handle, div), tag_counts in tag_counts_by_user_div.items():
+        operations.append(ReplaceOne(
+            {'userId': handle, 'div': div},
+            {'userId': handle, 'div': div, 'tagCounts': dict(tag_counts)},
+            upsert=True
+        ))
+
+    summary = bulk_upsert(tags_col, operations, chunk_size)
+    print("✅ Tags table updated (bulk).")
+    return summary
@@ -0,0 +1,140 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from submission_store import write_submissions
+
+# Below this many bytes of undecoded user.status replies the process pool costs more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+# Handles sent to a worker per task
+HANDLES_PER_TASK = 50
+
+# Verdicts that can still change (None: not judged yet)
+PENDING_VERDICTS = {None, 'SUBMITTED', 'TESTING'}
+
+
+def is_pending(submission):
+    """
+    True if a submission's outcome can still change: it is not judged yet, or it is only
+    accepted on pretests (system tests or a skip can still turn it into a rejection).
+    Submissions that failed pretests also keep testset PRETESTS, but that verdict is final.
+    """
+    verdict = submission.get('verdict')
+    return verdict in PENDING_VERDICTS or (verdict == 'OK' and submission.get('testset') == 'PRETESTS')
+
+
+def solved_problems(submissions):
+    """
+    Pick out the distinct problems solved in a list of submissions.
+    Returns a dict mapping problemId -> {'contestId', 'tags'} (first accepted submission wins).
+    """
+    solves = {}
+
+    for submission in submissions:
+        if submission.get('verdict') != 'OK':
+            continue
+
+        problem = submission.get('problem', {})
+        contest_id = problem.get('contestId')
+        index = problem.get('index')
+
+        if not contest_id or not index:
+            continue  # Skip malformed entries
+
+        problem_id = f"{contest_id}{index}"
+        if problem_id in solves:
+            continue  # Already counted for this user
+
+        solves[problem_id] = {'contestId': contest_id, 'tags': problem.get('tags', [])}
+
+    return solves
+
+
+def safe_high_water_mark(submissions):
+    """
+    Newest submission id the sync high-water mark may advance to: just below the oldest
+    pending submission (see is_pending), so it is fetched again once it has a final verdict.
+    Returns None for an empty list.
+    """
+    pending = [sub['id'] for sub in submissions if is_pending(sub)]
+    if pending:
+        return min(pending) - 1
+    return max((sub['id'] for sub in submissions), default=None)
+
+
+def _decode(payload):
+    # Full histories arrive as the raw user.status body; incremental fetches are already lists
+    if isinstance(payload, (bytes, bytearray)):
+        return json.loads(payload)['result']
+    return payload
+
+
+def _summarize_chunk(items, store_dir=None):
+    """
+    Worker task: decode and dedup the submissions of a batch of handles, appending
+    them to the submissions store at `store_dir` if one is given.
+    Pending submissions are neither stored nor counted as solves; they are refetched on a
+    later run, once their verdict is final.
+    Returns ({handle: solves}, {handle: safe high-water mark or None}, partial counters).
+    """
+    solves_by_handle = {}
+    last_submission_ids = {}
+    counters = Counter()
+    decoded = {}
+
+    for handle, payload in items:
+        submissions = _decode(payload)
+        decoded[handle] = [sub for sub in submissions if not is_pending(sub)]
+        solves = solved_problems(decoded[handle])
+        solves_by_handle[handle] = solves
+        last_submission_ids[handle] = safe_high_water_mark(submissions)
+        counters['handles'] += 1
+        counters['submissions'] += len(submissions)
+        counters['solves'] += len(solves)
+
+    if store_dir is not None:
+        write_submissions(decoded, store_dir)
+
+    return solves_by_handle, last_submission_ids, counters
+
+
+def collect_solves(submissions_by_handle, workers=None, store_dir=None):
+    """
+    For every handle, pick out the distinct problems solved in its fetched submissions
+    (either a list of submissions or the undecoded user.status body).
+    Large inputs are fanned out to a process pool in batches of HANDLES_PER_TASK handles,
+    with JSON decoding done in the workers, and the partial results merged;
+    small ones are handled in-process. With `store_dir`, every submission with a final
+    verdict is also persisted to the columnar submissions store (see submission_store).
+    Returns ({handle: {problemId: {'contestId', 'tags'}}}, {handle: high-water mark or None});
+    pending submissions count as no solve and marks never pass them (see is_pending).
+    """
+    items = list(submissions_by_handle.items())
+    raw_bytes = sum(len(payload) for _, payload in items if isinstance(payload, (bytes, bytearray)))
+    chunks = [items[i:i+HANDLES_PER_TASK] for i in range(0, len(items), HANDLES_PER_TASK)]
+
+    task = partial(_summarize_chunk, store_dir=store_dir)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) < 2 or raw_bytes < PARALLEL_MIN_BYTES:
+        solves_by_handle, last_submission_ids, counters = _merge(map(task, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            solves_by_handle, last_submission_ids, counters = _merge(executor.map(task, chunks))
+
+    print(f"Aggregated {counters['submissions']} submissions from {counters['handles']} handles "
+          f"into {counters['solves']} solves")
+    return solves_by_handle, last_submission_ids
+
+
+def _merge(results):
+    solves_by_handle = {}
+    last_submission_ids = {}
+    counters = Counter()
+    for partial_solves, partial_last_ids, partial_counters in results:
+        solves_by_handle.update(partial_solves)
+        last_submission_ids.update(partial_last_ids)
+        counters.update(partial_counters)
+    return solves_by_handle, last_submission_ids, counters
@@ -5,12 +5,14 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 from llm import process_llm_query
-def plot_rating_histogram(data):
+from cf_tags import CODEFORCES_TAGS, tag_key
+from materialize_views import VIEW_TOP_K
+from leaderboards import ACTIVE_WINDOW_SECONDS, RATING_TITLES, users_frame, rating_titles, college_stats, data_refresh_time, top_k_per_college, tag_matrix, rank_by_tags
+def plot_rating_histogram(ratings):
     """
-    data: list of user‐dicts with a 'rating' key
+    ratings: sequence of user ratings
     """
-    ratings = [u.get("rating", 0) for u in data]
-    if not ratings:
+    if len(ratings) == 0:
         st.warning("No ratings to plot.")
         return
 
@@ -21,12 +23,11 @@ def plot_rating_histogram(data):
     ax.set_ylabel("Number of Users")
     st.pyplot(fig)
 
-def plot_max_rating_histogram(data):
+def plot_max_rating_histogram(ratings):
     """
-    data: list of user‐dicts with a 'rating' key
+    ratings: sequence of user max ratings
     """
-    ratings = [u.get("maxRating", 0) for u in data]
-    if not ratings:
+    if len(ratings) == 0:
         st.warning("No ratings to plot.")
         return
 
@@ -62,83 +63,83 @@ def load_tag_data(data_folder="database"):
         print(f"Error loading tag data: {e}")
         return []
 
-def rank_users_by_selected_tags(user_data, tag_data, selected_tags):
-    if not selected_tags:
-        return user_data  # no tags selected, return original data
+def load_view(name, data_folder="database"):
+    """
+    Load a leaderboard view written by materialize_views, or None if it hasn't been built.
+    """
+    view_file = os.path.join(data_folder, f"coding_platform.{name}.json")
+    try:
+        with open(view_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading view {name}: {e}")
+        return None
 
-    # Create a map from userId to user for faster lookup
-    user_map = {user.get("handle", ""): user for user in user_data}
-    
-    # Map for converting display tag names to database field names
-    tag_name_map = {
-        "brute force": "brute_force",
-        "data structures": "data_structures",
-        "binary search": "binary_search",
-        "constructive algorithms": "constructive_algorithms",
-        "dfs and similar": "dfs_and_similar",
-        "dp": "dp",
-        "greedy": "greedy",
-        "implementation": "implementation",
-        "math": "math",
-        "sorting": "sorting"
-    }
-    
-    # Calculate tag scores for each user
-    for user in user_data:
-        user["_matching_tag_count"] = 0  # Initialize tag count for all users
-        # Initialize individual tag counts
-        for tag in selected_tags:
-            tag_lower = tag.lower()
-            db_field = tag_name_map.get(tag_lower, tag_lower)
-            user[f"_{db_field}_count"] = 0
-    
-    # Process tag data
-    for tag_entry in tag_data:
-        user_id = tag_entry.get("userId", "")
-        if user_id in user_map:
-            # Sum the count of problems solved for each selected tag
-            tag_sum = 0
-            for tag in selected_tags:
-                # Convert tag name to database field name
-                tag_lower = tag.lower()
-                db_field = tag_name_map.get(tag_lower, tag_lower)
-                
-                # Get the count from the database entry
-                tag_count = tag_entry.get(db_field, 0)
-                tag_sum += tag_count
-                
-                # Store individual tag counts for display
-                user_map[user_id][f"_{db_field}_count"] = tag_count
-            
-            user_map[user_id]["_matching_tag_count"] = tag_sum
-    
-    # Sort users by their tag scores in descending order
-    return sorted(user_data, key=lambda u: u.get("_matching_tag_count", 0), reverse=True)
+def data_version(data_folder="database"):
+    """
+    Change token for the exported data: the mtime of every JSON file in the folder.
+    It changes whenever an ingestion run rewrites the exports, invalidating the caches below.
+    """
+    try:
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime)
+            for entry in os.scandir(data_folder)
+            if entry.name.endswith(".json")
+        ))
+    except FileNotFoundError:
+        return ()
+
+# Loaded once per process and shared by every session; only the newest version is kept.
+# The cached objects are shared, so callers must not modify them.
+@st.cache_resource(max_entries=1, show_spinner="Loading data...")
+def get_dashboard_data(data_folder, version):
+    user_data = load_all_data(data_folder)
+    # Typed columns with both rating titles precomputed, for the vectorised filters
+    users = users_frame(user_data)
+    users["title"] = rating_titles(users["rating"])
+    users["maxTitle"] = rating_titles(users["maxRating"])
+    # User x tag solve counts (all divs summed); row i is users.iloc[i]
+    tag_counts, tag_columns = tag_matrix(load_tag_data(data_folder), users["handle"].tolist())
+    return users, tag_counts, tag_columns
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_view(name, data_folder, version):
+    return load_view(name, data_folder)
+
+# College vs College formula -> college_stats column
+COLLEGE_STAT_COLUMNS = {
+    "Avg Rating": "avgRating",
+    "Median Rating": "medianRating",
+    "P90 Rating": "p90Rating",
+    "Max Rating": "maxRating",
+    "Active Users": "activeUsers",
+    "User Count": "userCount",
+}
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_college_stats(data_folder, version):
+    """
+    College aggregates, cached until the exports change: the materialized view if it
+    has every column, otherwise computed once from the cached users frame.
+    """
+    stats_view = load_view("view_college_stats", data_folder)
+    if stats_view:
+        stats = pd.DataFrame(stats_view)
+        if set(COLLEGE_STAT_COLUMNS.values()) <= set(stats.columns):
+            return stats
+    users, _, _ = get_dashboard_data(data_folder, version)
+    # Same reference time as materialize_views, so "active" means the same on both paths
+    return college_stats(users, now=data_refresh_time(users))
 
-import requests
+from cf_api import get_client, CodeforcesAPIError
 
 def fetch_and_display_user_data(user_handle):
-    # Fetch user info
-    user_info_url = f"https://codeforces.com/api/user.info?handles={user_handle}"
-    user_rating_url = f"https://codeforces.com/api/user.rating?handle={user_handle}"
-
+    # Fetch user info (through the shared client, so repeated searches hit the response cache)
     try:
-        user_info_response = requests.get(user_info_url)
-        user_rating_response = requests.get(user_rating_url)
-
-        if user_info_response.status_code != 200 or user_rating_response.status_code != 200:
-            st.error("Please provide valid user handle")
-            return
-
-        user_info = user_info_response.json()
-        user_rating = user_rating_response.json()
-
-        if user_info['status'] != 'OK' or user_rating['status'] != 'OK':
-            st.error("Invalid response from Codeforces API.")
-            return
-
-        user = user_info['result'][0]
-        rating_history = user_rating['result']
+        user = get_client().call('user.info', {'handles': user_handle})[0]
+        rating_history = get_client().call('user.rating', {'handle': user_handle})
 
         # User statistics
         rating = user.get("rating", "Unrated")
@@ -168,15 +169,13 @@ def fetch_and_display_user_data(user_handle):
             else:
                 st.write("No contest history available.")
 
+    except CodeforcesAPIError:
+        st.error("Please provide valid user handle")
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
 
 
 def main():
-    # Load data
-    user_data = load_all_data()
-    tag_data = load_tag_data()
-
     # Streamlit page config
     st.set_page_config(
         page_title="CodeForces Analytics",
@@ -188,6 +187,11 @@ def main():
     # Hide error messages
     st.set_option('client.showErrorDetails', False)
 
+    # Load data (cached across reruns and sessions until the exports change)
+    data_folder = "database"
+    version = data_version(data_folder)
+    users, tag_counts, tag_columns = get_dashboard_data(data_folder, version)
+
     # Session state defaults
     if "user_handle" not in st.session_state:
         st.session_state.user_handle = ""
@@ -340,7 +344,7 @@ def main():
                     "Select Feature",
                     options=[
                         "None",
-                        "Top 3 from each college",
+                        "Top k from each college",
                     ],
                     index=0,
                     on_change=on_crazy_feature_change
@@ -351,21 +355,12 @@ def main():
                 if not is_crazy_selected:
                     # First show tag options since they take precedence
                     st.subheader("Problem Tags")
-                    tag_options = [
-                        "Greedy", 
-                        "DP", 
-                        "Math", 
-                        "Implementation", 
-                        "Brute Force", 
-                        "Data Structures", 
-                        "Binary Search",
-                        "Constructive Algorithms",
-                        "DFS and Similar"
-                    ]
+                    tag_options = CODEFORCES_TAGS
                     selected_tags = st.multiselect("Select Tags", options=tag_options, default=[])
                     
                     if selected_tags:
                         st.info("When problem tags are selected, users are ranked by the number of problems solved in these categories. Other filters are not applicable.")
+                        tag_top_n = st.number_input("Show top", min_value=1, value=100, step=10)
                         # Set default values for other filters that won't be shown
                         formula_option = "rating"
                         data_ordering_option = "Descending Order"
@@ -377,10 +372,12 @@ def main():
                         st.subheader("Data Ordering")
                         data_ordering_option = st.selectbox("Data Ordering", options=["Ascending Order","Descending Order"])
                         st.subheader("Candidate Title")
-                        candidate_title_option = st.selectbox("Candidate Title", options=["All", "Newbie", "Pupil","Specialist","Expert","Candidate Master","Master","International Master","Grandmaster"])
+                        candidate_title_option = st.selectbox("Candidate Title", options=["All"] + [title for _, title in RATING_TITLES])
                 else:
-                    # Defaults when crazy feature is active
-                    formula_option = "rating"
+                    # Top-k options; other filters don't apply
+                    st.subheader("Top k Options")
+                    top_k = st.number_input("Users per college (k)", min_value=1, value=3, step=1)
+                    formula_option = st.selectbox("Rank by", options=["rating", "maxRating"])
                     selected_tags = []
                     data_ordering_option = "Descending Order"
                     candidate_title_option = "All"  # Set default
@@ -394,7 +391,7 @@ def main():
                 
                 # Simple formula filter with rating and maxRating options
                 st.subheader("Formula Filters")
-                formula_option = st.selectbox("Formula", options=["Avg Rating", "Max Rating"])
+                formula_option = st.selectbox("Formula", options=list(COLLEGE_STAT_COLUMNS))
                 
                 # Add sort order option
                 st.subheader("Sort Order")
@@ -407,596 +404,85 @@ def main():
                 st.subheader("User vs User Comparison")
 
                 # College filtering
-                filtered_data = user_data
+                filtered_users = users
                 if selected_colleges != ["All"]:
-                    filtered_data = [u for u in filtered_data if u.get("college") in selected_colleges]
-
-                # Map for converting display tag names to database field names
-                tag_name_map = {
-                    "brute force": "brute_force",
-                    "data structures": "data_structures",
-                    "binary search": "binary_search",
-                    "constructive algorithms": "constructive_algorithms",
-                    "dfs and similar": "dfs_and_similar",
-                    "dp": "dp",
-                    "greedy": "greedy",
-                    "implementation": "implementation",
-                    "math": "math",
-                    "sorting": "sorting"
-                }
-                
-                # Map for converting database field names to display names
-                db_to_display = {
-                    "brute_force": "Brute Force",
-                    "data_structures": "Data Structures",
-                    "binary_search": "Binary Search",
-                    "constructive_algorithms": "Constructive Algorithms",
-                    "dfs_and_similar": "DFS and Similar",
-                    "dp": "DP",
-                    "greedy": "Greedy",
-                    "implementation": "Implementation",
-                    "math": "Math",
-                    "sorting": "Sorting"
-                }
+                    filtered_users = users[users["college"].isin(selected_colleges)]
 
                 try:
                     # Crazy features logic
-                    if is_crazy_selected and crazy_feature == "Top 3 from each college":
-                        # Convert filtered_data to DataFrame with consistent column names
-                        df_data = [{
-                            "Handle": u.get("handle", ""),
-                            "College": u.get("college", "Unknown"),
-                            "Rating": u.get("rating", 0),
-                            "Max Rating": u.get("maxRating", 0)
-                        } for u in filtered_data]
-                        
-                        # Create DataFrame
-                        df = pd.DataFrame(df_data)
-                        
-                        # Sort by rating or maxRating based on the selected formula
-                        sort_by = "Rating" if formula_option == "rating" else "Max Rating"
-                        df = df.sort_values(by=sort_by, ascending=False)
-                        
-                        # Group by college and get top 3 from each
-                        top_users_df = df.groupby("College").head(3).reset_index(drop=True)
+                    if is_crazy_selected and crazy_feature == "Top k from each college":
+                        # The precomputed view holds the top VIEW_TOP_K per college; larger k
+                        # (or a missing view) falls back to the grouped partial sort. Both read
+                        # the same snapshot: materialize_views rewrites the users export too
+                        top_view = get_view("view_top_by_college", data_folder, version)
+                        if top_view is not None and top_k <= VIEW_TOP_K:
+                            top_rows = [row for row in top_view if row["by"] == formula_option and row["rank"] <= top_k]
+                            if selected_colleges != ["All"]:
+                                top_rows = [row for row in top_rows if row["college"] in selected_colleges]
+                            top = pd.DataFrame(top_rows, columns=["handle", "college", "rating", "maxRating"])
+                        else:
+                            top = top_k_per_college(filtered_users, int(top_k), formula_option)
+
+                        top_users_df = pd.DataFrame({
+                            "Handle": top["handle"],
+                            "College": top["college"],
+                            "Rating": top["rating"],
+                            "Max Rating": top["maxRating"],
+                        }).reset_index(drop=True)
                         
                         # Sort by college name to keep colleges together
-                        top_users_df = top_users_df.sort_values(by="College")
+                        top_users_df = top_users_df.sort_values(by="College", kind="stable")
                         
                         # Display the DataFrame
                         st.dataframe(top_users_df)
                     
                     # Standard ranking logic
                     elif selected_tags:
-                        filtered_data = rank_users_by_selected_tags(filtered_data, tag_data, selected_tags)
-                        
+                        # Rank on the cached tag matrix; nothing shared is modified
+                        college_rows = users.index.get_indexer(filtered_users.index)
+                        ranked_rows, scores = rank_by_tags(tag_counts, tag_columns, selected_tags, k=int(tag_top_n), rows=college_rows)
+                        ranked = users.iloc[ranked_rows]
+
                         # Create a DataFrame with user information and tag counts
-                        display_data = []
-                        
-                        for user in filtered_data:
-                            user_info = {
-                                "Handle": user.get("handle", ""),
-                                "College": user.get("college", ""),
-                                "Rating": user.get("rating", 0),
-                                "Max Rating": user.get("maxRating", 0),
-                                "Problems Solved": user.get("_matching_tag_count", 0)  # Sum of all selected tags
-                            }
-                            
-                            # Add individual tag counts
-                            for tag in selected_tags:
-                                tag_lower = tag.lower()
-                                db_field = tag_name_map.get(tag_lower, tag_lower)
-                                display_name = db_to_display.get(db_field, tag)
-                                user_info[f"{display_name} Problems"] = user.get(f"_{db_field}_count", 0)
-                            
-                            display_data.append(user_info)
-                        
-                        df = pd.DataFrame(display_data)
+                        df = pd.DataFrame({
+                            "Handle": ranked["handle"].to_numpy(),
+                            "College": ranked["college"].to_numpy(),
+                            "Rating": ranked["rating"].to_numpy(),
+                            "Max Rating": ranked["maxRating"].to_numpy(),
+                            "Problems Solved": scores,  # Sum of all selected tags
+                        })
+
+                        # Add individual tag counts
+                        for tag in selected_tags:
+                            column = tag_columns.get(tag_key(tag))
+                            df[f"{tag} Problems"] = tag_counts[ranked_rows, column] if column is not None else 0
                         st.dataframe(df)
                     
-                    elif formula_option == "rating" and data_ordering_option=="Descending Order":
-                        if candidate_title_option == "All":
-                            # Show all users sorted by rating in descending order
-                            filtered_data = sorted(filtered_data, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0)
-                            } for u in filtered_data])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(filtered_data)
-                        
-                        elif candidate_title_option=="Newbie":
-                            newbies = [u for u in filtered_data if int(u.get("rating", 0)) <= 1199]
-                            newbies = sorted(newbies, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Newbie"
-                            } for u in newbies])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(newbies)
-
-                        elif candidate_title_option=="Pupil":
-                            pupils = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1399 and int(u.get("rating", 0)) >= 1200)]
-                            pupils = sorted(pupils, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Pupil"
-                            } for u in pupils])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(pupils)
-
-                        elif candidate_title_option=="Specialist":
-                            specialist = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1599 and int(u.get("rating", 0)) >= 1400)]
-                            specialist = sorted(specialist, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Specialist"
-                            } for u in specialist])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(specialist)
-
-                        elif candidate_title_option=="Expert":
-                            expert = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1899 and int(u.get("rating", 0)) >= 1600)]
-                            expert = sorted(expert, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Expert"
-                            } for u in expert])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(expert)
-
-                        elif candidate_title_option=="Candidate Master":
-                            candidate_master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2100 and int(u.get("rating", 0)) >= 1900)]
-                            candidate_master = sorted(candidate_master, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Candidate Master"
-                            } for u in candidate_master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(candidate_master)
-
-                        elif candidate_title_option=="Master":
-                            master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2299 and int(u.get("rating", 0)) >= 2100)]
-                            master = sorted(master, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Master"
-                            } for u in master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(master)
-
-                        elif candidate_title_option=="International Master":
-                            international_master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2399 and int(u.get("rating", 0)) >= 2300)]
-                            international_master = sorted(international_master, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"International Master"
-                            } for u in international_master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(international_master)
-
-                        elif candidate_title_option=="Grandmaster":
-                            grandmaster = [u for u in filtered_data if (int(u.get("rating", 0)) >= 2400)]
-                            grandmaster = sorted(grandmaster, key=lambda u: u.get("rating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Grandmaster"
-                            } for u in grandmaster])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(grandmaster)
-                    
-                    elif formula_option == "rating" and data_ordering_option=="Ascending Order":
-                        if candidate_title_option == "All":
-                            # Show all users sorted by rating in ascending order
-                            filtered_data = sorted(filtered_data, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0)
-                            } for u in filtered_data])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(filtered_data)
-                                
-                        elif candidate_title_option=="Newbie":
-                            newbies = [u for u in filtered_data if int(u.get("rating", 0)) <= 1199]
-                            newbies = sorted(newbies, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Newbie"
-                            } for u in newbies])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(newbies)
-
-                        elif candidate_title_option=="Pupil":
-                            pupils = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1399 and int(u.get("rating", 0)) >= 1200)]
-                            pupils = sorted(pupils, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Pupil"
-                            } for u in pupils])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(pupils)
-
-                        elif candidate_title_option=="Specialist":
-                            specialist = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1599 and int(u.get("rating", 0)) >= 1400)]
-                            specialist = sorted(specialist, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Specialist"
-                            } for u in specialist])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(specialist)
-
-                        elif candidate_title_option=="Expert":
-                            expert = [u for u in filtered_data if (int(u.get("rating", 0)) <= 1899 and int(u.get("rating", 0)) >= 1600)]
-                            expert = sorted(expert, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Expert"
-                            } for u in expert])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(expert)
-
-                        elif candidate_title_option=="Candidate Master":
-                            candidate_master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2100 and int(u.get("rating", 0)) >= 1900)]
-                            candidate_master = sorted(candidate_master, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Candidate Master"
-                            } for u in candidate_master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(candidate_master)
-
-                        elif candidate_title_option=="Master":
-                            master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2299 and int(u.get("rating", 0)) >= 2100)]
-                            master = sorted(master, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Master"
-                            } for u in master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(master)
-
-                        elif candidate_title_option=="International Master":
-                            international_master = [u for u in filtered_data if (int(u.get("rating", 0)) <= 2399 and int(u.get("rating", 0)) >= 2300)]
-                            international_master = sorted(international_master, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"International Master"
-                            } for u in international_master])
-                            st.dataframe(df)
-                            if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(international_master)
+                    else:
+                        # Vectorised over the cached users frame: one title lookup per
+                        # rating column, then mask, sort and display
+                        sort_by = formula_option  # "rating" or "maxRating"
+                        title_column = "title" if sort_by == "rating" else "maxTitle"
+                        frame = filtered_users
+                        if candidate_title_option != "All":
+                            frame = frame[frame[title_column] == candidate_title_option]
+                        frame = frame.sort_values(sort_by, ascending=(data_ordering_option == "Ascending Order"), kind="stable")
+
+                        df = pd.DataFrame({
+                            "Handle": frame["handle"],
+                            "College": frame["college"],
+                            "Rating": frame["rating"],
+                            "Max Rating": frame["maxRating"],
+                        }).reset_index(drop=True)
+                        if candidate_title_option != "All":
+                            df["Candidate Title"] = candidate_title_option
+                        st.dataframe(df)
 
-                        elif candidate_title_option=="Grandmaster":
-                            grandmaster = [u for u in filtered_data if (int(u.get("rating", 0)) >= 2400)]
-                            grandmaster = sorted(grandmaster, key=lambda u: u.get("rating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Grandmaster"
-                            } for u in grandmaster])
-                            st.dataframe(df)
+                        if sort_by == "rating":
                             if st.button("Show Rating Distribution"):
-                                plot_rating_histogram(grandmaster)
-                    
-                    elif formula_option == "maxRating" and data_ordering_option=="Descending Order":
-                        if candidate_title_option == "All":
-                            # Show all users sorted by maxRating in descending order
-                            filtered_data = sorted(filtered_data, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0)
-                            } for u in filtered_data])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(filtered_data)
-                                
-                        elif candidate_title_option=="Newbie":
-                            newbies = [u for u in filtered_data if int(u.get("maxRating", 0)) <= 1199]
-                            newbies = sorted(newbies, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Newbie"
-                            } for u in newbies])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(newbies)
-
-                        elif candidate_title_option=="Pupil":
-                            pupils = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1399 and int(u.get("maxRating", 0)) >= 1200)]
-                            pupils = sorted(pupils, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Pupil"
-                            } for u in pupils])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(pupils)
-
-                        elif candidate_title_option=="Specialist":
-                            specialist = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1599 and int(u.get("maxRating", 0)) >= 1400)]
-                            specialist = sorted(specialist, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Specialist"
-                            } for u in specialist])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(specialist)
-
-                        elif candidate_title_option=="Expert":
-                            expert = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1899 and int(u.get("maxRating", 0)) >= 1600)]
-                            expert = sorted(expert, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Expert"
-                            } for u in expert])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(expert)
-
-                        elif candidate_title_option=="Candidate Master":
-                            candidate_master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2100 and int(u.get("maxRating", 0)) >= 1900)]
-                            candidate_master = sorted(candidate_master, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Candidate Master"
-                            } for u in candidate_master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(candidate_master)
-                                
-                        elif candidate_title_option=="Master":
-                            master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2299 and int(u.get("maxRating", 0)) >= 2100)]
-                            master = sorted(master, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Master"
-                            } for u in master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(master)
-
-                        elif candidate_title_option=="International Master":
-                            international_master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2399 and int(u.get("maxRating", 0)) >= 2300)]
-                            international_master = sorted(international_master, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"International Master"
-                            } for u in international_master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(international_master)
-
-                        elif candidate_title_option=="Grandmaster":
-                            grandmaster = [u for u in filtered_data if (int(u.get("maxRating", 0)) >= 2400)]
-                            grandmaster = sorted(grandmaster, key=lambda u: u.get("maxRating", 0), reverse=True)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Grandmaster"
-                            } for u in grandmaster])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(grandmaster)
-                    
-                    elif formula_option == "maxRating" and data_ordering_option=="Ascending Order":
-                        if candidate_title_option == "All":
-                            # Show all users sorted by maxRating in ascending order
-                            filtered_data = sorted(filtered_data, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0)
-                            } for u in filtered_data])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(filtered_data)
-                                
-                        elif candidate_title_option=="Newbie":
-                            newbies = [u for u in filtered_data if int(u.get("maxRating", 0)) <= 1199]
-                            newbies = sorted(newbies, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Newbie"
-                            } for u in newbies])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(newbies)
-
-                        elif candidate_title_option=="Pupil":
-                            pupils = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1399 and int(u.get("maxRating", 0)) >= 1200)]
-                            pupils = sorted(pupils, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Pupil"
-                            } for u in pupils])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(pupils)
-
-                        elif candidate_title_option=="Specialist":
-                            specialist = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1599 and int(u.get("maxRating", 0)) >= 1400)]
-                            specialist = sorted(specialist, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Specialist"
-                            } for u in specialist])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(specialist)
-
-                        elif candidate_title_option=="Expert":
-                            expert = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 1899 and int(u.get("maxRating", 0)) >= 1600)]
-                            expert = sorted(expert, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Expert"
-                            } for u in expert])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(expert)
-
-                        elif candidate_title_option=="Candidate Master":
-                            candidate_master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2100 and int(u.get("maxRating", 0)) >= 1900)]
-                            candidate_master = sorted(candidate_master, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Candidate Master"
-                            } for u in candidate_master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(candidate_master)
-
-                        elif candidate_title_option=="Master":
-                            master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2299 and int(u.get("maxRating", 0)) >= 2100)]
-                            master = sorted(master, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Master"
-                            } for u in master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(master)
-
-                        elif candidate_title_option=="International Master":
-                            international_master = [u for u in filtered_data if (int(u.get("maxRating", 0)) <= 2399 and int(u.get("maxRating", 0)) >= 2300)]
-                            international_master = sorted(international_master, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"International Master"
-                            } for u in international_master])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(international_master)
-
-                        elif candidate_title_option=="Grandmaster":
-                            grandmaster = [u for u in filtered_data if (int(u.get("maxRating", 0)) >= 2400)]
-                            grandmaster = sorted(grandmaster, key=lambda u: u.get("maxRating", 0), reverse=False)
-                            df = pd.DataFrame([{
-                                "Handle": u.get("handle", ""),
-                                "College": u.get("college", ""),
-                                "Rating": u.get("rating", 0),
-                                "Max Rating": u.get("maxRating", 0),
-                                "Candidate Title":"Grandmaster"
-                            } for u in grandmaster])
-                            st.dataframe(df)
-                            if st.button("Show Max Rating Distribution"):
-                                plot_max_rating_histogram(grandmaster)
+                                plot_rating_histogram(frame["rating"])
+                        elif st.button("Show Max Rating Distribution"):
+                            plot_max_rating_histogram(frame["maxRating"])
                 
                 except Exception as e:
                     st.error("An error occurred while processing the data. Please try different filters.")
@@ -1006,46 +492,18 @@ def main():
                 st.subheader("College vs College Comparison")
                 
                 try:
-                    # Filter users
-                    filtered_users = user_data
-                    
-                    # Group users by college and calculate statistics
-                    college_stats = {}
-                    
-                    for user in filtered_users:
-                        college = user.get("college", "Unknown")
-                        if college not in college_stats:
-                            college_stats[college] = {
-                                "College": college,
-                                "User Count": 0,
-                                "Total Rating": 0,
-                                "Avg Rating": 0,
-                                "Max Rating": 0  # Track maximum rating in each college
-                            }
-                        
-                        college_stats[college]["User Count"] += 1
-                        college_stats[college]["Total Rating"] += user.get("rating", 0)
-                        
-                        # Track maximum rating for each college
-                        user_max_rating = user.get("maxRating", 0)
-                        if user_max_rating > college_stats[college]["Max Rating"]:
-                            college_stats[college]["Max Rating"] = user_max_rating
-                    
-                    # Calculate averages
-                    for college in college_stats:
-                        if college_stats[college]["User Count"] > 0:
-                            college_stats[college]["Avg Rating"] = college_stats[college]["Total Rating"] / college_stats[college]["User Count"]
-                    
-                    # Create DataFrame and sort based on formula option and order
-                    college_df = pd.DataFrame(list(college_stats.values()))
+                    stats = get_college_stats(data_folder, version)
+
+                    # Sort on the selected aggregate, then show every column under display names
                     ascending = (data_ordering_option == "Ascending Order")
-                    
-                    if formula_option == "Avg Rating":
-                        college_df = college_df.sort_values("Avg Rating", ascending=ascending)
-                    elif formula_option == "Max Rating":
-                        college_df = college_df.sort_values("Max Rating", ascending=ascending)
+                    college_df = stats.sort_values(COLLEGE_STAT_COLUMNS[formula_option], ascending=ascending, kind="stable")
+                    college_df = college_df.rename(columns={
+                        "college": "College",
+                        **{column: name for name, column in COLLEGE_STAT_COLUMNS.items()},
+                    }).reset_index(drop=True)
                     
                     st.dataframe(college_df)
+                    st.caption(f"Active users: seen online in the {ACTIVE_WINDOW_SECONDS // 86400} days before the last data refresh. Rating-title columns count users by current rating.")
                 
                 except Exception as e:
                     st.error("An error occurred while processing college data. Please try different filters.")
@@ -0,0 +1,219 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from response_cache import ResponseCache
+
+API_BASE_URL = "https://codeforces.com/api/"
+
+# Codeforces throttles per IP; these defaults stay just under the budget we get in practice
+REQUESTS_PER_SECOND = 2.0
+BURST_SIZE = 4
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT = 30
+
+RETRYABLE_HTTP_CODES = {429, 500, 502, 503, 504}
+
+# Every successful reply starts like this; checking the prefix lets call_raw skip decoding
+OK_PREFIX = b'{"status":"OK"'
+
+# On-disk response cache (set CF_CACHE_DISABLED=1 to bypass it)
+CACHE_DIR = os.environ.get("CF_CACHE_DIR", ".cf_cache")
+CACHE_MAX_BYTES = int(os.environ.get("CF_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CACHE_ENABLED = os.environ.get("CF_CACHE_DISABLED", "") not in ("1", "true", "yes")
+
+# Seconds a cached result stays fresh, per API method; None means it never expires.
+# Methods not listed here are never cached.
+CACHE_TTLS = {
+    'contest.standings': None,       # Only cached once the contest is FINISHED (see _is_cacheable)
+    'contest.ratingChanges': None,   # Only cached once rating changes are published
+    'contest.list': 60 * 60,
+    'user.info': 10 * 60,
+    'user.rating': 10 * 60,
+    'user.status': 10 * 60,
+}
+
+
+class CodeforcesAPIError(Exception):
+    """Raised when a Codeforces API call fails for good (after retries, or with a non-retryable reply)."""
+
+    def __init__(self, method, comment, status_code=None):
+        super().__init__(f"{method} failed: {comment}")
+        self.method = method
+        self.comment = comment
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire` blocks until a token is available,
+    so callers across all worker threads share one requests-per-second budget.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_limit_exceeded(comment):
+    return 'limit exceeded' in (comment or '').lower()
+
+
+def _is_cacheable(method, result):
+    # Permanent entries must only be written for results that can no longer change
+    if method == 'contest.standings':
+        return result.get('contest', {}).get('phase') == 'FINISHED'
+    if method == 'contest.ratingChanges':
+        return bool(result)
+    return True
+
+
+class CodeforcesClient:
+    """
+    Shared Codeforces API client: pooled HTTP connections, a token-bucket rate limit,
+    retries with exponential backoff on throttling and transient failures, and an
+    optional on-disk response cache with per-method TTLs.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST_SIZE, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, cache=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+
+    def call(self, method, params=None):
+        """
+        Call an API method (e.g. 'user.info') and return its 'result' field.
+        Fresh cached results are returned without touching the network.
+        Raises CodeforcesAPIError once retries are exhausted or the reply is a permanent failure.
+        """
+        use_cache = self.cache is not None and method in CACHE_TTLS
+        if use_cache:
+            key = ResponseCache.make_key(method, params or {})
+            cached = self.cache.get(key, CACHE_TTLS[method])
+            if cached is not None:
+                return cached
+
+        result = json.loads(self._fetch(method, params))['result']
+
+        if use_cache and _is_cacheable(method, result):
+            self.cache.put(key, result)
+        return result
+
+    def call_raw(self, method, params=None):
+        """
+        Like `call`, but return the undecoded JSON body of the reply (bytes, with the
+        result under 'result'). Lets large replies be decoded elsewhere, e.g. in a worker process.
+        Only methods whose results never need inspecting before caching are cached here.
+        """
+        use_cache = self.cache is not None and method in CACHE_TTLS and method.startswith('user.')
+        if use_cache:
+            key = ResponseCache.make_key('raw', method, params or {})
+            cached = self.cache.get_raw(key, CACHE_TTLS[method])
+            if cached is not None:
+                return cached
+
+        body = self._fetch(method, params)
+
+        if use_cache:
+            self.cache.put_raw(key, body)
+        return body
+
+    def _fetch(self, method, params):
+        """
+        Perform the request with rate limiting and retries; return the body of an OK reply.
+        """
+        url = API_BASE_URL + method
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff with jitter so parallel workers don't retry in lockstep
+                time.sleep(BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random()))
+
+            self.bucket.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = CodeforcesAPIError(method, str(e))
+                continue
+
+            if response.status_code in RETRYABLE_HTTP_CODES:
+                last_error = CodeforcesAPIError(method, f"HTTP {response.status_code}", response.status_code)
+                continue
+
+            body = response.content
+            if body.startswith(OK_PREFIX):
+                return body
+
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise CodeforcesAPIError(method, f"Invalid JSON (HTTP {response.status_code})", response.status_code)
+
+            if data.get('status') == 'OK':
+                return body
+
+            comment = data.get('comment', 'Unknown error')
+            last_error = CodeforcesAPIError(method, comment, response.status_code)
+            if not _is_limit_exceeded(comment):
+                # e.g. "handles: User with handle X not found" -- retrying won't help
+                raise last_error
+
+        raise last_error
+
+    def map(self, fn, items):
+        """
+        Apply `fn` to every item on the client's worker pool and return the results in order.
+        `fn` is expected to go through `call`, which keeps the pool inside the rate limit.
+        """
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+
+# Create a global instance of the client
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Get or create the process-wide Codeforces client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES) if CACHE_ENABLED else None
+            _client = CodeforcesClient(cache=cache)
+    return _client
@@ -0,0 +1,40 @@
+# Every problem tag Codeforces uses (as shown on problemset pages)
+CODEFORCES_TAGS = [
+    '*special', '2-sat', 'binary search', 'bitmasks', 'brute force',
+    'chinese remainder theorem', 'combinatorics', 'constructive algorithms',
+    'data structures', 'dfs and similar', 'divide and conquer', 'dp', 'dsu',
+    'expression parsing', 'fft', 'flows', 'games', 'geometry',
+    'graph matchings', 'graphs', 'greedy', 'hashing', 'implementation',
+    'interactive', 'math', 'matrices', 'meet-in-the-middle', 'number theory',
+    'probabilities', 'schedules', 'shortest paths', 'sortings',
+    'string suffix structures', 'strings', 'ternary search', 'trees',
+    'two pointers',
+]
+
+# Legacy tags documents only carried these, as flat top-level fields
+LEGACY_TAGS = [
+    'implementation', 'greedy', 'dp', 'math', 'brute force',
+    'data structures', 'binary search', 'constructive algorithms',
+    'dfs and similar', 'sorting',
+]
+
+
+def tag_key(tag):
+    """
+    Field name a tag is stored under in tags documents (e.g. 'brute force' -> 'brute_force').
+    """
+    return tag.lower().replace(" ", "_")
+
+
+def tag_counts(tag_entry):
+    """
+    Return the {tag_key: count} map of a tags document. Documents written before the
+    sparse `tagCounts` map existed are read from their legacy flat fields.
+    """
+    if 'tagCounts' in tag_entry:
+        return tag_entry['tagCounts']
+    return {
+        tag_key(tag): tag_entry[tag_key(tag)]
+        for tag in LEGACY_TAGS
+        if tag_entry.get(tag_key(tag))
+    }
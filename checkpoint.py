@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import time
+
+RUNS_DIR = "runs"
+
+
+class RunCheckpoint:
+    """
+    Persists the output of each pipeline stage, plus per-handle progress for long stages,
+    under <runs_dir>/<run_id>/ so an interrupted run can be resumed where it stopped.
+    """
+
+    def __init__(self, run_id=None, runs_dir=RUNS_DIR):
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+        self.directory = os.path.join(runs_dir, self.run_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def latest_run_id(runs_dir=RUNS_DIR):
+        """
+        Return the id of the most recently started run, or None if there is none.
+        """
+        try:
+            run_ids = sorted(
+                name for name in os.listdir(runs_dir)
+                if os.path.isdir(os.path.join(runs_dir, name))
+            )
+        except FileNotFoundError:
+            return None
+        return run_ids[-1] if run_ids else None
+
+    def _stage_path(self, stage):
+        return os.path.join(self.directory, f"{stage}.json")
+
+    def _handles_path(self, stage):
+        return os.path.join(self.directory, f"{stage}.handles")
+
+    def has(self, stage):
+        return os.path.exists(self._stage_path(stage))
+
+    def load(self, stage):
+        with open(self._stage_path(stage), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, stage, data):
+        # Write to a temp file and rename, so a crash never leaves a half-written stage behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._stage_path(stage))
+
+    def run_stage(self, stage, fn):
+        """
+        Return the saved output of `stage` if it already completed in this run,
+        otherwise run `fn()`, save its (JSON-serialisable) result and return it.
+        """
+        if self.has(stage):
+            print(f"[{self.run_id}] Skipping stage '{stage}' (already completed)")
+            return self.load(stage)
+        print(f"[{self.run_id}] Running stage '{stage}'...")
+        result = fn()
+        self.save(stage, result)
+        return result
+
+    def completed_handles(self, stage):
+        """
+        Return the handles already checkpointed for `stage`.
+        """
+        try:
+            with open(self._handles_path(stage), "r", encoding="utf-8") as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def mark_handles_done(self, stage, handles):
+        """
+        Append handles to the stage's checkpoint; flushed to disk before returning.
+        """
+        with open(self._handles_path(stage), "a", encoding="utf-8") as f:
+            for handle in handles:
+                f.write(handle + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -1,5 +1,10 @@
+import hashlib
 import json
+import os
 import re
+import tempfile
+import threading
+from functools import lru_cache
 
 # Define a reusable separator regex for spaces, hyphens, en-dashes, em-dashes, parentheses, and commas
 _sep = r"[\s\-\u2013\u2014\(\),]*"
@@ -34,37 +39,192 @@ _canonical_map = {
     'BITSKKBIRLA':   re.compile(rf"\bbits{_sep}kk{_sep}birla\b", re.IGNORECASE),
 }
 
+_INLINE_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+def compile_canonical_matcher(canonical_map):
+    """
+    Compile all patterns of `canonical_map` into one regex so an organization string
+    is scanned once instead of once per college.
+    Each pattern becomes a named alternative inside a lookahead; scanning every word
+    boundary therefore reports, per position, the earliest college (in map order) that
+    matches there. Taking the earliest over all positions gives exactly the same answer
+    as trying the patterns one by one in map order.
+    Returns (compiled regex, {group name: (order, canonical key)}).
+    """
+    alternatives = []
+    groups = {}
+    for order, (canon, pat) in enumerate(canonical_map.items()):
+        flags = ''.join(letter for flag, letter in _INLINE_FLAGS if pat.flags & flag)
+        body = f"(?{flags}:{pat.pattern})" if flags else f"(?:{pat.pattern})"
+        name = f"c{order}"
+        alternatives.append(f"(?P<{name}>{body})")
+        groups[name] = (order, canon)
+    return re.compile(r"\b(?=" + "|".join(alternatives) + ")"), groups
+
+_combined_matcher, _combined_groups = compile_canonical_matcher(_canonical_map)
+
+def _match_combined(org_name, matcher, groups):
+    best = None
+    for m in matcher.finditer(org_name):
+        order, canon = groups[m.lastgroup]
+        if best is None or order < best[0]:
+            best = (order, canon)
+            if order == 0:
+                break
+    return best[1] if best else 'Unknown'
+
+@lru_cache(maxsize=4096)
+def _map_default_organization(org_name):
+    # The same few hundred raw strings repeat across every contest, so cache them
+    return _match_combined(org_name, _combined_matcher, _combined_groups)
+
+def match_organization(org_name, canonical_map=_canonical_map):
+    """
+    Map a single organization name with the regexes only (no table, no overrides).
+    Returns 'Unknown' if no pattern matches.
+    """
+    if not org_name:
+        return 'Unknown'
+    if canonical_map is _canonical_map:
+        return _map_default_organization(org_name)
+    matcher, groups = compile_canonical_matcher(canonical_map)
+    return _match_combined(org_name, matcher, groups)
+
 def map_organizations(raw_list, canonical_map=_canonical_map):
     """
     Given a list of raw organization names, returns a dict mapping each raw name to its canonical key.
-    Unmatched names map to 'Unknown'.
+    Unmatched names map to 'Unknown'. Uses the regexes only; see map_single_organization for lookups.
     """
     mapped = {}
     for org in raw_list:
-        found = next((canon for canon, pat in canonical_map.items() if pat.search(org)), None)
-        mapped[org] = found or 'Unknown'
+        mapped[org] = match_organization(org, canonical_map)
     return mapped
 
-def load_and_map_from_file(filename, canonical_map=_canonical_map):
+def load_and_map_from_file(filename, canonical_map=_canonical_map, save_to=None):
     """
     Load a JSON array of organization names from `filename` and map them.
+    If `save_to` is given, the mapping is also written there as the persisted
+    raw-string -> canonical table used by map_single_organization.
     Returns the mapping dict.
     """
     with open(filename, 'r', encoding='utf-8') as f:
         raw_list = json.load(f)
-    return map_organizations(raw_list, canonical_map)
+    mapped = map_organizations(raw_list, canonical_map)
+    if save_to:
+        _write_cache(save_to, {normalize_organization(raw): canon for raw, canon in mapped.items()})
+    return mapped
+
+# Persisted lookup tables. The table is a generated local cache (load_and_map_from_file /
+# save_organization_table), kept out of the source tree; the overrides file is committed,
+# edited by hand to settle ambiguous strings, and always wins.
+_here = os.path.dirname(os.path.abspath(__file__))
+ORGANIZATION_TABLE_FILE = os.environ.get('ORGANIZATION_CACHE_FILE', os.path.join(_here, '.org_cache', 'organization_table.json'))
+ORGANIZATION_OVERRIDES_FILE = os.path.join(_here, 'organization_overrides.json')
+
+# Past this many entries, strings that mapped to 'Unknown' are dropped when the cache is saved
+ORGANIZATION_CACHE_MAX_ENTRIES = 100000
+
+def patterns_fingerprint(canonical_map=_canonical_map):
+    """
+    Hash of the canonical patterns; a cached table built with other patterns is discarded.
+    """
+    spec = [(canon, pat.pattern, pat.flags) for canon, pat in canonical_map.items()]
+    return hashlib.sha256(json.dumps(spec).encode('utf-8')).hexdigest()
+
+_PATTERNS_FINGERPRINT = patterns_fingerprint()
+
+_organization_table = None
+_organization_overrides = None
+_table_dirty = False
+# map_single_organization runs on the API client's worker threads
+_tables_lock = threading.Lock()
+
+def normalize_organization(org_name):
+    """
+    Normalize a raw organization string for table lookups (case and whitespace only,
+    which the regexes ignore anyway).
+    """
+    return ' '.join(org_name.split()).casefold()
+
+def _read_table(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return {normalize_organization(raw): canon for raw, canon in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+def _read_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('patterns') != _PATTERNS_FINGERPRINT:
+        print("Organization patterns changed; rebuilding the organization cache")
+        return {}
+    return cache.get('table', {})
+
+def _write_cache(path, table):
+    if len(table) > ORGANIZATION_CACHE_MAX_ENTRIES:
+        table = {raw: canon for raw, canon in table.items() if canon != 'Unknown'}
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'patterns': _PATTERNS_FINGERPRINT, 'table': dict(sorted(table.items()))}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _load_tables():
+    global _organization_table, _organization_overrides
+    if _organization_table is not None:
+        return
+    with _tables_lock:
+        if _organization_table is None:
+            # Overrides first: the table being set is what tells other threads both are loaded
+            _organization_overrides = _read_table(ORGANIZATION_OVERRIDES_FILE)
+            _organization_table = _read_cache(ORGANIZATION_TABLE_FILE)
+
+def save_organization_table(path=ORGANIZATION_TABLE_FILE):
+    """
+    Persist strings first seen in this process (mapped through the regex fallback) to the
+    local organization cache, so the next run resolves them straight from the table.
+    """
+    global _table_dirty
+    with _tables_lock:
+        if _organization_table is None or not _table_dirty:
+            return
+        _write_cache(path, _organization_table)
+        _table_dirty = False
 
 def map_single_organization(org_name, canonical_map=_canonical_map):
     """
     Given a single organization name as string, returns the mapped canonical key.
     Returns 'Unknown' if no match is found.
+    With the default map, the overrides file is consulted first, then the persisted
+    table; only strings missing from both fall back to the regexes (and are added
+    to the table).
     """
-    found = next((canon for canon, pat in canonical_map.items() if pat.search(org_name)), None)
-    return found or 'Unknown'
+    global _table_dirty
+    if not org_name:
+        return 'Unknown'
+    if canonical_map is not _canonical_map:
+        return match_organization(org_name, canonical_map)
+
+    _load_tables()
+    key = normalize_organization(org_name)
+    if key in _organization_overrides:
+        return _organization_overrides[key]
+    mapped = _organization_table.get(key)
+    if mapped is None:
+        mapped = match_organization(org_name)
+        with _tables_lock:
+            _organization_table[key] = mapped
+            _table_dirty = True
+    return mapped
 
 # Example usage:
 # if __name__ == '__main__':
-#     result = load_and_map_from_file('organization_list.txt')
+#     result = load_and_map_from_file('organization_list.txt', save_to=ORGANIZATION_TABLE_FILE)
 #     for raw, canon in result.items():
 #         print(f"{raw!r:45} -> {canon}")
 #
@@ -1,89 +1,367 @@
-import requests
-import time
-from get_iit_guys import get_valid_participants_with_org
+import argparse
+from cf_api import get_client, CodeforcesAPIError
+from checkpoint import RunCheckpoint
+from aggregate import collect_solves
+from submission_store import STORE_DIR, solves_by_handle as stored_solves_by_handle
+from mongo import get_database
+from materialize_views import materialize_views
+from setupdb import migrate
+from get_iit_guys import lookup_organizations, to_valid_participant
+from college_map import save_organization_table
 from extract_div import extract_division
-from add_to_database import update_users_from_api, update_contests, update_problems_from_participants, update_tags_table
-def get_recent_contests(n=10):
-    # API URL
-    url = "https://codeforces.com/api/contest.list"
+from add_to_database import update_users_from_api, update_contests, update_problems_from_participants, update_tags_table, load_contest_divisions, load_sync_state, update_sync_state, update_solved_table, load_handle_orgs, update_handle_orgs, update_rating_table
 
-    # Fetch contests
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch contests: {response.status_code}")
+# Page size used when pulling only the submissions newer than a handle's high-water mark
+SUBMISSIONS_PAGE_SIZE = 100
 
-    data = response.json()
-    if data['status'] != 'OK':
-        raise Exception("Error fetching contest list")
+# Handles processed (fetched, written and checkpointed) together in the submissions stage
+SUBMISSIONS_CHUNK_SIZE = 200
+
+# Rows requested per contest.standings page in discovery mode
+STANDINGS_PAGE_SIZE = 5000
+
+# How long a cached handle -> organization entry is trusted before user.info is asked again
+ORGANIZATION_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+def get_contest_list():
+    """
+    Fetch the full contest.list once (raises CodeforcesAPIError if it can't be fetched).
+    """
+    return get_client().call('contest.list')
+
+def get_recent_contests(n=10, contests=None):
+    # Fetch contests unless an already-fetched contest.list is passed in
+    if contests is None:
+        contests = get_contest_list()
 
     # Filter out only finished contests
-    contests = [contest for contest in data['result'] if contest['phase'] == 'FINISHED']
+    contests = [contest for contest in contests if contest['phase'] == 'FINISHED']
 
     # Get the most recent 'n' contests
     recent_contests = contests[:n]
     print(f'{recent_contests} + \n')
     return recent_contests
 
-def get_participants_from_contest(contest_id):
+def iter_standings_rows(contest_id, page_size=STANDINGS_PAGE_SIZE):
     """
-    Given a contest ID, fetch the list of participant handles.
+    Yield the standings rows of a contest page by page (contest.standings from/count),
+    so only one page is held in memory at a time however large the contest is.
+    """
+    start = 1
+    while True:
+        result = get_client().call('contest.standings', {'contestId': contest_id, 'from': start, 'count': page_size})
+        rows = result['rows']
+        del result  # Drop the page's problem list etc.; only the rows are needed
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+def iter_contestants(contest_id, stop=None, page_size=STANDINGS_PAGE_SIZE):
+    """
+    Yield the members of every CONTESTANT party in a contest's standings, one at a time.
+    `stop` is an optional predicate on the standings row (e.g. lambda row: row['rank'] > 1000);
+    as soon as it returns True no further rows or pages are requested.
     """
-    url = f"https://codeforces.com/api/contest.standings?contestId={contest_id}&from=1"
+    for row in iter_standings_rows(contest_id, page_size):
+        if stop is not None and stop(row):
+            return
+        party = row['party']
+        if party['participantType'] != 'CONTESTANT':  # Only real contestants
+            continue
+        yield from party['members']
 
+def get_participants_from_contest(contest_id, stop=None):
+    """
+    Given a contest ID, fetch the list of participant handles.
+    """
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] != 'OK':
-            print(f"Error fetching standings for contest {contest_id}")
-            return []
-
-        rows = data['result']['rows']
-        participants = []
-
-        for row in rows:
-            party = row['party']
-            if party['participantType'] == 'CONTESTANT':  # Only real contestants
-                for member in party['members']:
-                    participants.append(member['handle'])
-    
-        return participants
-
-    except Exception as e:
-        print(f"Exception fetching standings for contest {contest_id}: {e}")
+        return [member['handle'] for member in iter_contestants(contest_id, stop)]
+
+    except CodeforcesAPIError as e:
+        print(f"Error fetching standings for contest {contest_id}: {e}")
         return []
 def get_all_participants(contests):
     """
     Iterate through all contests and collect unique participants.
+    Standings are fetched concurrently through the shared rate-limited client.
     """
     all_participants = set()
 
-    for idx, contest in enumerate(contests):
-        contest_id = contest['id']
-        print(f"Fetching participants for contest {contest_id} ({idx+1}/{len(contests)})...")
-        
-        participants = get_participants_from_contest(contest_id)
+    contest_ids = [contest['id'] for contest in contests]
+    print(f"Fetching participants for {len(contest_ids)} contests...")
+
+    for participants in get_client().map(get_participants_from_contest, contest_ids):
         all_participants.update(participants)
-        
-        time.sleep(0.5)  # Be nice to the API (0.5 sec delay)
 
     return all_participants
 
+def _discover_in_contest(contest_id, max_age_seconds, stop=None):
+    """
+    Stream one contest's standings and sort its contestants as the pages arrive:
+    handles with a fresh cached organization are resolved on the spot (non-college ones
+    are dropped), the rest are returned as pending user.info lookups.
+    Returns (valid participants by handle, pending handles), or None if the standings
+    could not be fetched.
+    """
+    valid = {}
+    pending = set()
+    page_handles = []
+
+    def resolve_page():
+        cached = load_handle_orgs(page_handles, max_age_seconds)
+        for handle in page_handles:
+            if handle in cached:
+                participant = to_valid_participant(handle, cached[handle])
+                if participant:
+                    valid[handle] = participant
+            else:
+                pending.add(handle)
+        page_handles.clear()
+
+    try:
+        for member in iter_contestants(contest_id, stop):
+            page_handles.append(member['handle'])
+            if len(page_handles) >= STANDINGS_PAGE_SIZE:
+                resolve_page()
+        resolve_page()
+    except CodeforcesAPIError as e:
+        print(f"Error fetching standings for contest {contest_id}: {e}")
+        return None
+
+    return valid, pending
+
+def discover_college_participants(contests, max_age_seconds=ORGANIZATION_MAX_AGE_SECONDS, stop=None):
+    """
+    Discovery mode: page through each contest's standings and keep only college participants.
+    Standings rows carry handles but not organizations, so organizations come from the
+    handle_orgs cache; user.info is called only for handles never seen or gone stale.
+    `stop` is passed on to iter_contestants to cut each contest's scan short.
+    Returns the same list shape as get_valid_participants_with_org.
+    Raises CodeforcesAPIError if any contest's standings failed, after caching the
+    organizations that were looked up, so the stage is not saved and a resume retries it.
+    """
+    contest_ids = [contest['id'] for contest in contests]
+    print(f"Discovering college participants in {len(contest_ids)} contests...")
+
+    valid = {}
+    pending = set()
+    failed_contests = []
+    results = get_client().map(lambda contest_id: _discover_in_contest(contest_id, max_age_seconds, stop), contest_ids)
+    for contest_id, result in zip(contest_ids, results):
+        if result is None:
+            failed_contests.append(contest_id)
+            continue
+        contest_valid, contest_pending = result
+        valid.update(contest_valid)
+        pending.update(contest_pending)
+
+    pending -= valid.keys()
+    print(f"{len(valid)} college participants resolved from cache, {len(pending)} handles need user.info")
+
+    organizations = lookup_organizations(pending)
+    update_handle_orgs(organizations)
+    for handle, organization in organizations.items():
+        participant = to_valid_participant(handle, organization)
+        if participant:
+            valid[handle] = participant
+
+    save_organization_table()  # Remember newly seen organization strings for the next run
+    if failed_contests:
+        raise CodeforcesAPIError('contest.standings', f"standings of contests {failed_contests} could not be fetched")
+    return list(valid.values())
+
+def get_rating_changes(contest_id):
+    """
+    Fetch every rating change of a contest in one call (contest.ratingChanges).
+    Unrated contests (and failed requests) give an empty list.
+    """
+    try:
+        return get_client().call('contest.ratingChanges', {'contestId': contest_id})
+    except CodeforcesAPIError as e:
+        print(f"No rating changes for contest {contest_id}: {e}")
+        return []
+
+def get_rating_changes_for_contests(contests):
+    """
+    Fetch rating changes for all contests concurrently.
+    Returns a dict mapping contestId -> list of rating changes.
+    """
+    contest_ids = [contest['id'] for contest in contests]
+    print(f"Fetching rating changes for {len(contest_ids)} contests...")
+    return dict(zip(contest_ids, get_client().map(get_rating_changes, contest_ids)))
+
+def get_user_submissions(handle):
+    """
+    Fetch the full submission history (user.status) of a single handle.
+    The reply is returned undecoded (JSON bytes): full histories can hold tens of thousands
+    of submissions, and decoding them is left to the aggregation worker processes.
+    Returns None if the request fails, so callers can tell it apart from an empty history.
+    """
+    try:
+        return get_client().call_raw('user.status', {'handle': handle})
+    except CodeforcesAPIError as e:
+        print(f"Error fetching submissions for {handle}: {e}")
+        return None
+
+def get_new_submissions(handle, last_submission_id, page_size=SUBMISSIONS_PAGE_SIZE):
+    """
+    Fetch only the submissions newer than `last_submission_id`, paging through
+    user.status with from/count (newest first) until the high-water mark is reached.
+    Returns None if a request fails, so the handle's mark is left untouched.
+    """
+    new_submissions = []
+    start = 1
+
+    while True:
+        try:
+            page = get_client().call('user.status', {'handle': handle, 'from': start, 'count': page_size})
+        except CodeforcesAPIError as e:
+            print(f"Error fetching submissions for {handle}: {e}")
+            return None
+
+        for submission in page:
+            if submission['id'] <= last_submission_id:
+                return new_submissions
+            new_submissions.append(submission)
+
+        if len(page) < page_size:
+            return new_submissions
+        start += page_size
+
+def get_submissions_for_participants(valid_participants, sync_state=None):
+    """
+    Fetch user.status exactly once per valid participant.
+    Handles with a high-water mark in `sync_state` only get their new submissions (a list);
+    the others get their full history (undecoded JSON bytes, see get_user_submissions).
+    Returns a dict mapping handle -> submissions; failed handles are left out.
+    """
+    sync_state = sync_state or {}
+    handles = list(dict.fromkeys(participant['handle'] for participant in valid_participants))
+    print(f"Fetching submissions for {len(handles)} handles...")
+
+    def fetch(handle):
+        last_submission_id = sync_state.get(handle, {}).get('lastSubmissionId')
+        if last_submission_id is None:
+            return get_user_submissions(handle)
+        return get_new_submissions(handle, last_submission_id)
+
+    results = get_client().map(fetch, handles)
+
+    return {
+        handle: submissions
+        for handle, submissions in zip(handles, results)
+        if submissions is not None
+    }
+
+
+def ingest_submissions(valid_participants, contest_divisions, checkpoint, chunk_size=SUBMISSIONS_CHUNK_SIZE):
+    """
+    Submissions stage: fetch new submissions, append them to the submissions store and
+    record solves, `chunk_size` handles at a time.
+    Handles are checkpointed after each chunk is written, so a resumed run skips them.
+    Raises CodeforcesAPIError once every chunk is done if some handles could not be fetched,
+    so the stage is not saved and a resumed run retries exactly those handles.
+    """
+    done = checkpoint.completed_handles('submissions')
+    remaining = [p for p in valid_participants if p['handle'] not in done]
+    print(f"{len(done)} handles already ingested, {len(remaining)} to go")
+
+    for i in range(0, len(remaining), chunk_size):
+        chunk = remaining[i:i+chunk_size]
+        sync_state = load_sync_state([p['handle'] for p in chunk])
+        submissions_by_handle = get_submissions_for_participants(chunk, sync_state)
+        solves_by_handle, last_submission_ids = collect_solves(submissions_by_handle, store_dir=STORE_DIR)
+        update_solved_table(chunk, solves_by_handle, contest_divisions)
+        update_sync_state(last_submission_ids)
+        # Handles whose fetch failed are not checkpointed, so a rerun retries them
+        checkpoint.mark_handles_done('submissions', solves_by_handle.keys())
+
+    missing = {p['handle'] for p in valid_participants} - checkpoint.completed_handles('submissions')
+    if missing:
+        raise CodeforcesAPIError('user.status', f"submissions of {len(missing)} handles could not be fetched")
+
+def run_pipeline(n_contests=3, run_id=None):
+    """
+    Run the ingestion pipeline as explicit stages:
+    contests -> participants -> users -> ratings -> submissions -> aggregates -> views.
+    Every stage's output is saved under runs/<run_id>/; passing the id of an interrupted
+    run resumes it from the first unfinished stage (and, within submissions, the first
+    unfinished handle).
+    """
+    migrate()  # Creates missing/outdated indexes once; a no-op when the schema is current
+    checkpoint = RunCheckpoint(run_id)
+    print(f"Run id: {checkpoint.run_id}")
+
+    def contests_stage():
+        contest_list = get_contest_list()
+        contests = get_recent_contests(n_contests, contest_list)
+        update_contests(contests)
+        return {'contest_list': contest_list, 'contests': contests}
+
+    stage = checkpoint.run_stage('contests', contests_stage)
+    contest_list, contests = stage['contest_list'], stage['contests']
+
+    # Discovery filters organisations while streaming standings, so raw participants and
+    # valid participants come out of a single stage
+    valid_participants = checkpoint.run_stage('participants', lambda: discover_college_participants(contests))
+    print(f"Total valid participants with known organizations: {len(valid_participants)}")
+
+    checkpoint.run_stage('users', lambda: update_users_from_api(valid_participants))
+
+    contest_divisions = load_contest_divisions(contest_list)
+    checkpoint.run_stage('ratings', lambda: update_rating_table(get_rating_changes_for_contests(contests), contest_divisions))
+
+    checkpoint.run_stage('submissions', lambda: ingest_submissions(valid_participants, contest_divisions, checkpoint))
+
+    def aggregates_stage():
+        update_problems_from_participants()
+        return update_tags_table(valid_participants)
+
+    checkpoint.run_stage('aggregates', aggregates_stage)
+    checkpoint.run_stage('views', materialize_views)
+    print(f"Run {checkpoint.run_id} completed.")
+    return checkpoint.run_id
+
+def rebuild_from_store(contest_list=None):
+    """
+    Recompute the solved, problems and tags collections (and the leaderboard views) of
+    every known user purely from the local submissions store, without calling the Codeforces API for submissions.
+    """
+    migrate()
+    valid_participants = [
+        {'handle': user['handle'], 'mapped_organization': user.get('organization')}
+        for user in get_database()['users'].find({}, {'_id': 0, 'handle': 1, 'organization': 1})
+    ]
+    print(f"Rebuilding aggregates of {len(valid_participants)} users from {STORE_DIR}...")
+
+    contest_divisions = load_contest_divisions(contest_list if contest_list is not None else get_contest_list())
+    solves = stored_solves_by_handle([p['handle'] for p in valid_participants])
+    update_solved_table(valid_participants, solves, contest_divisions)
+    update_problems_from_participants()
+    summary = update_tags_table(valid_participants)
+    materialize_views()
+    return summary
+
 
 # Example usage
 if __name__ == "__main__":
-    contests = get_recent_contests(3)
-    update_contests(contests)
-    all_participants = get_all_participants(contests)
-    # print(f"Fetched {len(contests)} contests.")
-    # print("Some example participants:", list(all_participants))
-    valid_participants = get_valid_participants_with_org(all_participants)
-    print(f"Total valid participants with known organizations: {len(valid_participants)}")
-    # for p in valid_participants[:5]:  # Print first 10 as example
-    #     print(p)
-    update_users_from_api(valid_participants)
-    update_problems_from_participants(valid_participants)
-    update_tags_table(valid_participants)
-    # for contest in contests[:5]:  # Just printing first 5 for demo
-    #     division = extract_division(contest['name'])
-    #     print(f"Name: {contest['name']}, ID: {contest['id']}, Division: {division}")
+    parser = argparse.ArgumentParser(description="Ingest recent Codeforces contests for college users.")
+    parser.add_argument('--contests', type=int, default=3, help="number of recent finished contests to scan")
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help="resume an interrupted run (the latest one if no id is given)")
+    parser.add_argument('--rebuild-from-store', action='store_true',
+                        help="recompute solved/problems/tags from the local submissions store and exit")
+    args = parser.parse_args()
+
+    if args.rebuild_from_store:
+        rebuild_from_store()
+        raise SystemExit(0)
+
+    run_id = args.resume
+    if run_id == 'latest':
+        run_id = RunCheckpoint.latest_run_id()
+        if run_id is None:
+            parser.error("no previous run to resume")
+
+    run_pipeline(args.contests, run_id)
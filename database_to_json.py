@@ -1,10 +1,10 @@
-from pymongo import MongoClient
 from bson import json_util
 import json
 from collections import defaultdict
+from setupdb import SCHEMA_VERSION
+from mongo import get_database
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["coding_platform"]
+db = get_database()
 
 def infer_bson_type(value):
     if isinstance(value, str):
@@ -25,10 +25,12 @@ def infer_bson_type(value):
 
 schema = {
     "collections": [],
-    "version": 1
+    "version": SCHEMA_VERSION
 }
 
 for name in db.list_collection_names():
+    if name == "schema_meta":
+        continue
     coll = db[name]
     sample_doc = coll.find_one()
     
@@ -1,48 +1,118 @@
-from college_map import map_single_organization
-import time 
-import requests
+import re
+from urllib.parse import quote
+from college_map import map_single_organization, save_organization_table
+from cf_api import get_client, CodeforcesAPIError, API_BASE_URL
+
+# user.info accepts up to 10000 handles, but the request line is capped well before that;
+# batches are packed up to whichever limit is hit first
+USER_INFO_MAX_HANDLES = 10000
+USER_INFO_MAX_URL_LENGTH = 8000
+
+_NOT_FOUND_RE = re.compile(r"User with handle (\S+) not found", re.IGNORECASE)
+
+def pack_handle_batches(handles, max_handles=USER_INFO_MAX_HANDLES, max_url_length=USER_INFO_MAX_URL_LENGTH):
+    """
+    Split handles into user.info batches that are as large as the URL length allows.
+    """
+    base_length = len(API_BASE_URL + 'user.info?handles=')
+    separator_length = len(quote(';', safe=''))
+
+    batches = []
+    current = []
+    length = base_length
+    for handle in handles:
+        added = len(quote(handle, safe='')) + (separator_length if current else 0)
+        if current and (length + added > max_url_length or len(current) >= max_handles):
+            batches.append(current)
+            current = []
+            length = base_length
+            added = len(quote(handle, safe=''))
+        current.append(handle)
+        length += added
+    if current:
+        batches.append(current)
+    return batches
+
 def get_user_info(handles):
     """
     Fetch user information (including organization) for a list of handles.
     Max 10000 handles per call as per Codeforces API limit.
+    One unknown handle fails the whole call, so the handle named in the error is
+    dropped and the rest retried; if the culprit can't be identified the batch is split.
+    """
+    handles = list(handles)
+    while handles:
+        try:
+            return get_client().call('user.info', {'handles': ';'.join(handles)})
+        except CodeforcesAPIError as e:
+            if e.status_code != 400:
+                # Not a bad-handle reply (the client already retried transient errors)
+                print(f"Error fetching user info: {e}")
+                return []
+
+            match = _NOT_FOUND_RE.search(e.comment)
+            bad = match.group(1).lower() if match else None
+            remaining = [h for h in handles if h.lower() != bad]
+            if bad and len(remaining) < len(handles):
+                print(f"Dropping unknown handle {match.group(1)}")
+                handles = remaining
+                continue
+
+            if len(handles) == 1:
+                print(f"Error fetching user info for {handles[0]}: {e}")
+                return []
+            mid = len(handles) // 2
+            return get_user_info(handles[:mid]) + get_user_info(handles[mid:])
+    return []
+
+def fetch_user_infos(participants):
     """
-    handle_str = ';'.join(handles)
-    url = f"https://codeforces.com/api/user.info?handles={handle_str}"
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] != 'OK':
-            print(f"Error fetching user info")
-            return []
-        return data['result']
-    except Exception as e:
-        print(f"Exception fetching user info: {e}")
-        return []
+    Fetch user.info for every handle in as few calls as the URL length allows.
+    Returns a dict mapping handle -> user object for the handles that exist.
+    Batches are fetched concurrently through the shared rate-limited client.
+    """
+    batches = pack_handle_batches(list(dict.fromkeys(participants)))
+
+    users = {}
+    for user_info_list in get_client().map(get_user_info, batches):
+        for user in user_info_list:
+            users[user['handle']] = user
+    return users
+
+def to_valid_participant(handle, organization):
+    """
+    Build the valid-participant dict for a handle, or return None if its
+    organization doesn't map to a known college.
+    """
+    mapped_org = map_single_organization(organization or '')
+    if mapped_org == 'Unknown':
+        return None
+    return {
+        'handle': handle,
+        'organization': organization,
+        'mapped_organization': mapped_org
+    }
+
+def lookup_organizations(participants):
+    """
+    Fetch the raw organization of every handle via user.info.
+    Returns a dict mapping handle -> organization ('' if the user didn't set one).
+    """
+    return {
+        handle: user.get('organization', '')
+        for handle, user in fetch_user_infos(participants).items()
+    }
 
 def get_valid_participants_with_org(participants):
     """
     Given a set of participants, returns a list of (handle, organization) where organization is known.
     """
     valid_participants = []
-    participants = list(participants)
 
-    batch_size = 100  # API allows a big number, but small batch is safer
-    for i in range(0, len(participants), batch_size):
-        batch = participants[i:i+batch_size]
-        user_info_list = get_user_info(batch)
-        
-        for user in user_info_list:
-            organization = user.get('organization', '')
-            mapped_org = map_single_organization(organization)
-            if mapped_org != 'Unknown':
-                valid_participants.append({
-                    'handle': user['handle'],
-                    'organization': organization,
-                    'mapped_organization': mapped_org
-                })
-        
-        time.sleep(0.5)  # Be nice to Codeforces API
-
-    return valid_participants
\ No newline at end of file
+    for handle, organization in lookup_organizations(participants).items():
+        participant = to_valid_participant(handle, organization)
+        if participant:
+            valid_participants.append(participant)
+
+    save_organization_table()  # Remember newly seen organization strings for the next run
+    return valid_participants
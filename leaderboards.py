@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from cf_tags import CODEFORCES_TAGS, tag_key, tag_counts
+
+# (lowest rating, title) in ascending order; a rating belongs to the last title it reaches
+RATING_TITLES = [
+    (0, "Newbie"),
+    (1200, "Pupil"),
+    (1400, "Specialist"),
+    (1600, "Expert"),
+    (1900, "Candidate Master"),
+    (2100, "Master"),
+    (2300, "International Master"),
+    (2400, "Grandmaster"),
+]
+
+# A user counts as active in college stats if seen online within this window
+ACTIVE_WINDOW_SECONDS = 30 * 24 * 60 * 60
+
+_TITLE_THRESHOLDS = np.array([threshold for threshold, _ in RATING_TITLES])
+_TITLE_NAMES = np.array([title for _, title in RATING_TITLES], dtype=object)
+
+
+def users_frame(users):
+    """
+    Build a DataFrame (handle, college, rating, maxRating, lastOnlineTimeSeconds)
+    from user documents; missing ratings count as 0.
+    """
+    frame = pd.DataFrame(list(users), columns=["handle", "college", "rating", "maxRating", "lastOnlineTimeSeconds"])
+    frame["college"] = frame["college"].fillna("Unknown")
+    frame["rating"] = pd.to_numeric(frame["rating"], errors="coerce").fillna(0).astype(int)
+    frame["maxRating"] = pd.to_numeric(frame["maxRating"], errors="coerce").fillna(0).astype(int)
+    frame["lastOnlineTimeSeconds"] = pd.to_numeric(frame["lastOnlineTimeSeconds"], errors="coerce").fillna(0).astype(int)
+    return frame
+
+
+def rating_titles(ratings):
+    """
+    Map an array of ratings to their Codeforces titles in one searchsorted pass.
+    """
+    positions = np.searchsorted(_TITLE_THRESHOLDS, np.asarray(ratings), side="right") - 1
+    return _TITLE_NAMES[np.clip(positions, 0, len(_TITLE_NAMES) - 1)]
+
+
+def rating_bands(frame):
+    """
+    Title of every user by current rating and by max rating.
+    """
+    return pd.DataFrame({
+        "handle": frame["handle"],
+        "college": frame["college"],
+        "rating": frame["rating"],
+        "maxRating": frame["maxRating"],
+        "title": rating_titles(frame["rating"]),
+        "maxTitle": rating_titles(frame["maxRating"]),
+    })
+
+
+def data_refresh_time(frame):
+    """
+    Reference time of a users snapshot: the latest lastOnlineTimeSeconds in it.
+    Derived from the data itself, so every consumer of the same snapshot agrees on it.
+    """
+    return int(frame["lastOnlineTimeSeconds"].max()) if len(frame) else 0
+
+
+def college_stats(frame, now=None, active_window=ACTIVE_WINDOW_SECONDS):
+    """
+    Per-college aggregates in one grouped pass: user count, mean / median / p90 rating,
+    highest max rating, users active within `active_window` seconds of `now`, and a
+    histogram of current rating titles (one column per title in RATING_TITLES).
+    `now` defaults to the snapshot's data_refresh_time, not the wall clock.
+    """
+    if now is None:
+        now = data_refresh_time(frame)
+
+    columns = frame[["college", "rating", "maxRating"]].assign(
+        active=frame["lastOnlineTimeSeconds"] >= now - active_window,
+        title=rating_titles(frame["rating"]),
+    )
+    grouped = columns.groupby("college")
+    stats = grouped.agg(
+        userCount=("rating", "size"),
+        avgRating=("rating", "mean"),
+        medianRating=("rating", "median"),
+        maxRating=("maxRating", "max"),
+        activeUsers=("active", "sum"),
+    )
+    stats.insert(3, "p90Rating", grouped["rating"].quantile(0.9))
+
+    bands = pd.crosstab(columns["college"], columns["title"]).reindex(columns=_TITLE_NAMES, fill_value=0)
+    stats = stats.join(bands).fillna(0)
+    stats.columns.name = None
+
+    stats = stats.reset_index().sort_values("avgRating", ascending=False, ignore_index=True)
+    return stats.astype({"activeUsers": int, **{title: int for title in _TITLE_NAMES}})
+
+
+def top_k_per_college(frame, k, by="rating"):
+    """
+    The `k` best users of every college by `by` ('rating' or 'maxRating'), with their rank.
+    Uses a per-college partial sort (nlargest), so the full population is never sorted;
+    ties keep frame order. Rows come out grouped by college, best first.
+    """
+    if frame.empty:
+        return frame.assign(rank=pd.Series(dtype=int))
+    top_index = frame.groupby("college", sort=True)[by].nlargest(k).index.get_level_values(-1)
+    top = frame.loc[top_index]
+    return top.assign(rank=top.groupby("college").cumcount() + 1).reset_index(drop=True)
+
+
+def tag_matrix(tag_entries, handles):
+    """
+    Dense (len(handles) x tags) matrix of solve counts, with a user's rows for all divs summed.
+    Returns (counts, tag_columns) where tag_columns maps tag_key -> column; row i is handles[i].
+    Tags outside CODEFORCES_TAGS found in the data get extra columns.
+    """
+    row_of = {handle: i for i, handle in enumerate(handles)}
+    tag_columns = {tag_key(tag): i for i, tag in enumerate(CODEFORCES_TAGS)}
+
+    rows, columns, values = [], [], []
+    for entry in tag_entries:
+        row = row_of.get(entry.get("userId"))
+        if row is None:
+            continue
+        for key, count in tag_counts(entry).items():
+            rows.append(row)
+            columns.append(tag_columns.setdefault(key, len(tag_columns)))
+            values.append(count)
+
+    counts = np.zeros((len(handles), len(tag_columns)), dtype=np.int32)
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), values)
+    return counts, tag_columns
+
+
+def rank_by_tags(counts, tag_columns, tags, k=None, rows=None):
+    """
+    Rank users by their total solves over `tags` (one column sum per call).
+    `rows` restricts the ranking to some row positions; `k` keeps only the top k,
+    selected with argpartition. Returns (row positions, scores), best first.
+    Neither input is modified.
+    """
+    selected = [tag_columns[tag_key(tag)] for tag in tags if tag_key(tag) in tag_columns]
+    if rows is None:
+        rows = np.arange(counts.shape[0])
+    scores = counts[np.ix_(rows, selected)].sum(axis=1) if selected else np.zeros(len(rows), dtype=counts.dtype)
+
+    if k is not None and k < len(rows):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(rows))
+    # Order the survivors by score, ties by original position
+    order = top[np.lexsort((top, -scores[top]))]
+    return rows[order], scores[order]
+
+
+def top_k_per_tag(tag_entries, k):
+    """
+    The `k` users with the most solves of every tag in every div, from tags documents.
+    """
+    rows = [
+        (entry.get("userId"), entry.get("div"), tag, count)
+        for entry in tag_entries
+        for tag, count in tag_counts(entry).items()
+        if count
+    ]
+    frame = pd.DataFrame(rows, columns=["userId", "div", "tag", "count"])
+    top = frame.sort_values("count", ascending=False, kind="stable").groupby(["tag", "div"]).head(k).copy()
+    top["rank"] = top.groupby(["tag", "div"]).cumcount() + 1
+    return top.sort_values(["tag", "div", "rank"], ignore_index=True)
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+
+from pymongo import ASCENDING, DESCENDING
+
+from leaderboards import users_frame, rating_bands, college_stats, data_refresh_time, top_k_per_college, top_k_per_tag
+from mongo import get_database
+
+# Users kept per college / per (tag, div) in the top-k views
+VIEW_TOP_K = 10
+
+# Folder the dashboard reads its data from
+VIEWS_FOLDER = "database"
+
+# Raw exports the dashboard loads, rewritten from the same snapshot as the views
+EXPORTED_COLLECTIONS = ('users', 'tags')
+
+# view collection -> list of (index name, keys, options), in setupdb.INDEXES format
+VIEW_INDEXES = {
+    'view_college_stats': [
+        ('college_1', [('college', ASCENDING)], {'unique': True}),
+        ('avgRating_-1', [('avgRating', DESCENDING)], {}),
+        ('medianRating_-1', [('medianRating', DESCENDING)], {}),
+        ('p90Rating_-1', [('p90Rating', DESCENDING)], {}),
+        ('maxRating_-1', [('maxRating', DESCENDING)], {}),
+        ('activeUsers_-1', [('activeUsers', DESCENDING)], {}),
+    ],
+    'view_rating_bands': [
+        ('handle_1', [('handle', ASCENDING)], {'unique': True}),
+        ('title_1_rating_-1', [('title', ASCENDING), ('rating', DESCENDING)], {}),
+        ('maxTitle_1_maxRating_-1', [('maxTitle', ASCENDING), ('maxRating', DESCENDING)], {}),
+    ],
+    'view_top_by_college': [
+        ('by_1_college_1_rank_1', [('by', ASCENDING), ('college', ASCENDING), ('rank', ASCENDING)], {'unique': True}),
+    ],
+    'view_top_by_tag': [
+        ('tag_1_div_1_rank_1', [('tag', ASCENDING), ('div', ASCENDING), ('rank', ASCENDING)], {'unique': True}),
+    ],
+}
+
+
+def build_views(users, tag_entries, k=VIEW_TOP_K):
+    """
+    Compute every leaderboard view from user and tags documents.
+    Returns a dict mapping view name -> list of row dicts.
+    """
+    frame = users_frame(users)
+
+    top_by_college = []
+    for by in ('rating', 'maxRating'):
+        top = top_k_per_college(frame, k, by)[['college', 'rank', 'handle', 'rating', 'maxRating']]
+        top_by_college.extend(dict(row, by=by) for row in top.to_dict('records'))
+
+    return {
+        'view_college_stats': college_stats(frame, now=data_refresh_time(frame)).to_dict('records'),
+        'view_rating_bands': rating_bands(frame).to_dict('records'),
+        'view_top_by_college': top_by_college,
+        'view_top_by_tag': top_k_per_tag(tag_entries, k).to_dict('records'),
+    }
+
+
+def _replace_collection(db, name, rows):
+    # Build the new contents in a side collection, then swap it in with a single rename,
+    # so readers never see a half-written view
+    staging = db[f"{name}_staging"]
+    staging.drop()
+    if rows:
+        staging.insert_many([dict(row) for row in rows], ordered=False)
+    for index_name, keys, options in VIEW_INDEXES[name]:
+        staging.create_index(keys, name=index_name, **options)
+    if rows:
+        staging.rename(name, dropTarget=True)
+    else:
+        db[name].drop()
+        staging.drop()
+
+
+def _write_export(name, rows, folder):
+    # Same naming as the database_to_json exports the dashboard already reads
+    path = os.path.join(folder, f"coding_platform.{name}.json")
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(rows, f, default=int)
+    os.replace(tmp_path, path)
+
+
+def materialize_views(db=None, folder=VIEWS_FOLDER, k=VIEW_TOP_K):
+    """
+    Post-ingestion step: recompute the leaderboard views and publish them both as
+    collections (with their sort indexes) and as JSON files for the dashboard.
+    The users and tags exports the dashboard loads are rewritten from the same snapshot,
+    so precomputed views and anything the dashboard ranks live always agree.
+    Returns the number of rows per view.
+    """
+    if db is None:
+        db = get_database()
+
+    snapshot = {name: list(db[name].find({}, {'_id': 0})) for name in EXPORTED_COLLECTIONS}
+    views = build_views(snapshot['users'], snapshot['tags'], k)
+
+    os.makedirs(folder, exist_ok=True)
+    for name, rows in views.items():
+        _replace_collection(db, name, rows)
+        _write_export(name, rows, folder)
+        print(f"Materialized {name}: {len(rows)} rows")
+    for name, rows in snapshot.items():
+        _write_export(name, rows, folder)
+        print(f"Exported {name}: {len(rows)} documents")
+
+    return {name: len(rows) for name, rows in views.items()}
+
+
+if __name__ == "__main__":
+    materialize_views()
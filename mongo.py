@@ -0,0 +1,60 @@
+import os
+import threading
+
+from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
+
+# Connection settings, overridable through the environment
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "coding_platform")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_WRITE_CONCERN = os.environ.get("MONGO_WRITE_CONCERN", "1")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "60000"))
+
+
+def _parse_write_concern(value):
+    # "majority" stays a string, "0"/"1"/... become node counts
+    return int(value) if value.isdigit() else value
+
+
+# Create a global instance of the client
+_client = None
+_client_lock = threading.Lock()
+
+def get_mongo_client():
+    """
+    Get or create the process-wide MongoClient. PyMongo pools connections internally,
+    so every reader and writer should share this one instead of opening its own.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            )
+    return _client
+
+
+def get_database(name=MONGO_DB_NAME):
+    """
+    Get the application database on the shared client, with the configured write concern.
+    """
+    return get_mongo_client().get_database(
+        name,
+        write_concern=WriteConcern(w=_parse_write_concern(MONGO_WRITE_CONCERN)),
+    )
+
+
+def close_mongo_client():
+    """
+    Close the shared client (e.g. at the end of a long-running process).
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
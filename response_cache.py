@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for JSON API results.
+    Entries live at <directory>/<2 hex chars>/<sha256 of key>.json[.gz]; freshness is judged
+    from the file's mtime, and the least recently used files are evicted once the
+    cache grows past `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes, compress=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.total_bytes = None  # Computed lazily on the first write
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        suffix = '.json.gz' if self.compress else '.json'
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key, ttl):
+        """
+        Return the cached value for `key`, or None if it is missing or older than `ttl`
+        seconds (`ttl=None` means it never expires).
+        """
+        data = self.get_raw(key, ttl)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def put(self, key, value):
+        """
+        Store the JSON-serialisable `value` under `key`.
+        """
+        self.put_raw(key, json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+    def get_raw(self, key, ttl):
+        """
+        Like `get`, but return the stored bytes without decoding them.
+        """
+        path = self._path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if ttl is not None and age > ttl:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            if self.compress:
+                data = gzip.decompress(data)
+        except (OSError, EOFError, zlib.error):
+            return None
+
+        # Refresh atime only, so LRU eviction sees the hit without resetting the TTL clock
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+        return data
+
+    def put_raw(self, key, data):
+        """
+        Store `data` (bytes) under `key`, atomically, then evict old entries if over budget.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data) if self.compress else data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_atime, stat.st_size
+
+    def _evict(self):
+        # Drop least recently used entries until we're back under 90% of the budget
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.total_bytes = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+            except OSError:
+                pass
@@ -1,29 +1,103 @@
-from pymongo import MongoClient, ASCENDING
+from pymongo import ASCENDING
+from mongo import get_database
 
-# Connect to MongoDB (update with your connection URI)
-client = MongoClient("mongodb://localhost:27017/")
-db = client['coding_platform']
+# Bump this whenever INDEXES changes; `migrate` is a no-op while the stored version matches
+SCHEMA_VERSION = 4
 
-# 1. Users collection
-users = db['users']
-users.create_index([('handle', ASCENDING)], unique=True)
+# collection -> list of (index name, keys, options). Mirrors the layout in db_schema.json.
+INDEXES = {
+    # 1. Users collection
+    'users': [
+        ('handle_1', [('handle', ASCENDING)], {'unique': True}),
+    ],
+    # 2. Contests collection
+    'contests': [
+        ('contestId_1', [('contestId', ASCENDING)], {'unique': True}),
+    ],
+    # 3. Tags collection
+    # Composite PK: (userId, div); the wildcard index covers every tagCounts.<tag> field,
+    # so ad-hoc queries on any tag use an index (a div condition is applied to the scanned rows).
+    # Ranked "top users for tag X in div Y" is precomputed in view_top_by_tag (materialize_views)
+    'tags': [
+        ('userId_1_div_1', [('userId', ASCENDING), ('div', ASCENDING)], {'unique': True}),
+        ('tagCounts.$**_1', [('tagCounts.$**', ASCENDING)], {}),
+    ],
+    # 4. Rating collection
+    # Composite PK: (handle, contestId)
+    'rating': [
+        ('handle_1_contestId_1', [('handle', ASCENDING), ('contestId', ASCENDING)], {'unique': True}),
+    ],
+    # 5. Problems collection
+    # Composite PK: (problemId, organisation)
+    'problems': [
+        ('problemId_1_organisation_1', [('problemId', ASCENDING), ('organisation', ASCENDING)], {'unique': True}),
+    ],
+    # 6. Solved collection (one row per user per solved problem)
+    'solved': [
+        ('handle_1_problemId_1', [('handle', ASCENDING), ('problemId', ASCENDING)], {'unique': True}),
+    ],
+    # 7. Sync state collection (per-handle submission high-water mark)
+    'sync_state': [
+        ('handle_1', [('handle', ASCENDING)], {'unique': True}),
+    ],
+    # 8. Handle organizations collection (raw organization cache for discovery)
+    'handle_orgs': [
+        ('handle_1', [('handle', ASCENDING)], {'unique': True}),
+    ],
+}
 
-# 2. Contests collection
-contests = db['contests']
-contests.create_index([('contestId', ASCENDING)], unique=True)
 
-# 3. Tags collection
-tags = db['tags']
-# Composite PK: (handle, division)
-tags.create_index([('handle', ASCENDING), ('division', ASCENDING)], unique=True)
+def _is_up_to_date(existing, keys, options):
+    return (
+        existing is not None
+        and list(existing['key']) == keys
+        and bool(existing.get('unique')) == bool(options.get('unique'))
+    )
 
-# 4. Rating collection
-rating = db['rating']
-# Composite PK: (handle, contestId)
-rating.create_index([('handle', ASCENDING), ('contestId', ASCENDING)], unique=True)
 
-# 5. Problems collection
-problems = db['problems']
-problems.create_index([('problemID', ASCENDING)], unique=True)
+def ensure_indexes(db):
+    """
+    Create every index in INDEXES that is missing or whose definition changed.
+    Indexes on managed collections that are no longer declared are dropped.
+    Indexes that already match are left alone, so nothing is rebuilt needlessly.
+    """
+    for coll_name, specs in INDEXES.items():
+        coll = db[coll_name]
+        existing = coll.index_information()
+        wanted = {name for name, _, _ in specs}
 
-print("MongoDB schema setup completed with indexes.")
+        for name in existing:
+            if name != '_id_' and name not in wanted:
+                coll.drop_index(name)
+                print(f"Dropped obsolete index {coll_name}.{name}")
+
+        for name, keys, options in specs:
+            if _is_up_to_date(existing.get(name), keys, options):
+                continue
+            if name in existing:
+                coll.drop_index(name)
+            coll.create_index(keys, name=name, **options)
+            print(f"Created index {coll_name}.{name}")
+
+
+def migrate(db=None, force=False):
+    """
+    Bring the database up to SCHEMA_VERSION. The applied version is recorded in the
+    schema_meta collection, so calling this at the start of every run is cheap.
+    """
+    if db is None:
+        db = get_database()
+
+    meta_col = db['schema_meta']
+    meta = meta_col.find_one({'_id': 'schema'}) or {}
+    if not force and meta.get('version') == SCHEMA_VERSION:
+        return
+
+    print(f"Migrating schema from version {meta.get('version')} to {SCHEMA_VERSION}...")
+    ensure_indexes(db)
+    meta_col.update_one({'_id': 'schema'}, {'$set': {'version': SCHEMA_VERSION}}, upsert=True)
+
+
+if __name__ == "__main__":
+    migrate(force=True)
+    print("MongoDB schema setup completed with indexes.")
@@ -0,0 +1,174 @@
+import os
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Every fetched submission is kept here as Parquet, partitioned by month of creationTime
+# (<STORE_DIR>/month=YYYY-MM/*.parquet), so new metrics never require a refetch
+STORE_DIR = os.environ.get("SUBMISSIONS_STORE_DIR", "submissions_store")
+
+SUBMISSION_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('handle', pa.string()),
+    ('contestId', pa.int64()),
+    ('index', pa.string()),
+    ('problemId', pa.string()),
+    ('verdict', pa.string()),
+    ('rating', pa.int32()),
+    ('tags', pa.list_(pa.string())),
+    ('creationTime', pa.int64()),
+    ('programmingLanguage', pa.string()),
+    ('participantType', pa.string()),
+    ('fetchedAt', pa.int64()),  # ms since epoch; the newest copy of a refetched submission wins
+    ('month', pa.string()),
+])
+
+_PARTITIONING = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+
+def to_table(submissions_by_handle, fetched_at=None):
+    """
+    Flatten {handle: [submission, ...]} (decoded user.status results) into an Arrow table.
+    Every row is stamped with `fetched_at` (ms since epoch, default now).
+    """
+    if fetched_at is None:
+        fetched_at = time.time_ns() // 1_000_000
+    columns = {name: [] for name in SUBMISSION_SCHEMA.names}
+
+    for handle, submissions in submissions_by_handle.items():
+        for submission in submissions:
+            problem = submission.get('problem', {})
+            contest_id = problem.get('contestId')
+            index = problem.get('index')
+            created = submission.get('creationTimeSeconds')
+
+            columns['id'].append(submission.get('id'))
+            columns['handle'].append(handle)
+            columns['contestId'].append(contest_id)
+            columns['index'].append(index)
+            columns['problemId'].append(f"{contest_id}{index}" if contest_id and index else None)
+            columns['verdict'].append(submission.get('verdict'))
+            columns['rating'].append(problem.get('rating'))
+            columns['tags'].append(problem.get('tags', []))
+            columns['creationTime'].append(created)
+            columns['programmingLanguage'].append(submission.get('programmingLanguage'))
+            columns['participantType'].append(submission.get('author', {}).get('participantType'))
+            columns['fetchedAt'].append(fetched_at)
+            columns['month'].append(time.strftime('%Y-%m', time.gmtime(created)) if created else 'unknown')
+
+    return pa.table(columns, schema=SUBMISSION_SCHEMA)
+
+
+def write_submissions(submissions_by_handle, directory=STORE_DIR):
+    """
+    Append submissions to the store as new Parquet files (one per touched month).
+    Files get unique names, so concurrent writers never collide. Returns the rows written.
+    """
+    table = to_table(submissions_by_handle)
+    if table.num_rows == 0:
+        return 0
+
+    pq.write_to_dataset(
+        table,
+        root_path=directory,
+        partitioning=_PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return table.num_rows
+
+
+def _latest_copies(frame):
+    # File order is not write order, so keep the most recently fetched copy of every
+    # submission; rows written before fetchedAt existed count as the oldest
+    frame = frame.sort_values('fetchedAt', kind='stable', na_position='first')
+    return frame.drop_duplicates(subset=['handle', 'id'], keep='last')
+
+
+def read_submissions(columns=None, handles=None, verdict=None, directory=STORE_DIR):
+    """
+    Load stored submissions as a pandas DataFrame, optionally restricted to some columns,
+    handles and a verdict. A submission fetched more than once appears only once, as its
+    latest copy; the verdict filter applies to that copy.
+    """
+    if not os.path.isdir(directory):
+        return SUBMISSION_SCHEMA.empty_table().to_pandas()[columns or SUBMISSION_SCHEMA.names]
+
+    dataset = ds.dataset(directory, schema=SUBMISSION_SCHEMA, format='parquet', partitioning=_PARTITIONING)
+
+    expression = None
+    if handles is not None:
+        expression = ds.field('handle').isin(list(handles))
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(['handle', 'id', 'fetchedAt', 'verdict'] + list(columns)))
+
+    # Deduplicate before filtering on verdict, so an outdated copy never passes the filter
+    frame = _latest_copies(dataset.to_table(columns=read_columns, filter=expression).to_pandas())
+    if verdict is not None:
+        frame = frame[frame['verdict'] == verdict]
+    return frame[columns] if columns is not None else frame
+
+
+def solves_by_handle(handles=None, directory=STORE_DIR):
+    """
+    Derive the distinct solved problems of every stored handle, in the same shape as
+    aggregate.collect_solves: {handle: {problemId: {'contestId', 'tags'}}}.
+    The earliest accepted submission of each problem wins.
+    """
+    frame = read_submissions(
+        columns=['handle', 'id', 'problemId', 'contestId', 'tags'],
+        handles=handles, verdict='OK', directory=directory,
+    )
+    frame = frame.dropna(subset=['problemId'])
+    frame = frame.sort_values('id').drop_duplicates(subset=['handle', 'problemId'], keep='first')
+
+    solves = {}
+    for handle, problem_id, contest_id, tags in zip(
+            frame['handle'], frame['problemId'], frame['contestId'], frame['tags']):
+        solves.setdefault(handle, {})[problem_id] = {
+            'contestId': int(contest_id),
+            'tags': list(tags) if tags is not None else [],
+        }
+    return solves
+
+
+def compact(directory=STORE_DIR):
+    """
+    Rewrite every month partition as a single deduplicated file.
+    Ingestion appends a few small files per chunk; compacting keeps reads fast.
+    """
+    if not os.path.isdir(directory):
+        return
+
+    for name in sorted(os.listdir(directory)):
+        partition = os.path.join(directory, name)
+        if not name.startswith('month=') or not os.path.isdir(partition):
+            continue
+
+        files = [f for f in os.listdir(partition) if f.endswith('.parquet')]
+        if len(files) < 2:
+            continue
+
+        table = pq.read_table(partition, schema=SUBMISSION_SCHEMA.remove(SUBMISSION_SCHEMA.get_field_index('month')))
+        frame = _latest_copies(table.to_pandas()).sort_values(['handle', 'id'])
+        compacted = pa.Table.from_pandas(frame, schema=table.schema, preserve_index=False)
+
+        # Publish the compacted file before dropping the old ones: readers briefly see
+        # duplicates (removed by read_submissions) but never missing rows.
+        # The '_' prefix hides the half-written file from dataset discovery.
+        basename = f"part-{uuid.uuid4().hex}-0.parquet"
+        tmp_path = os.path.join(partition, '_' + basename)
+        pq.write_table(compacted, tmp_path)
+        os.replace(tmp_path, os.path.join(partition, basename))
+        for f in files:
+            os.remove(os.path.join(partition, f))
+        print(f"Compacted {name}: {len(files)} files, {compacted.num_rows} submissions")
+
+
+if __name__ == "__main__":
+    compact()